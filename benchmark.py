@@ -0,0 +1,207 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from cryptobot import CryptoChatbot
+from fake_coingecko import FakeCoinGecko, synthetic_universe
+from market_store import MarketStore
+from sustainability import CONSENSUS_SCORES, compute_scores
+
+DEFAULT_SIZES = [10, 1000, 10000]
+
+# One representative query per respond_to_query branch
+INTENT_QUERIES = {
+    'specific': "what's the bitcoin price?",
+    'greeting': "hello there",
+    'sustainable': "which coin is the most sustainable?",
+    'trending': "what's trending today?",
+    'price': "show me current prices",
+    'market': "who are the market leaders?",
+    'profit': "any good investment ideas?",
+    'default': "tell me something",
+}
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def measure(name: str, coins: int, func: Callable[[], object], min_time: float,
+            max_iterations: int, setup: Optional[Callable[[], object]] = None) -> Dict[str, object]:
+    """Time func repeatedly, running setup (untimed) before each call"""
+    func()  # Warm-up, so one-off lazy loading isn't counted
+    timings = []
+    deadline = time.perf_counter() + min_time
+    while len(timings) < max_iterations and (time.perf_counter() < deadline or len(timings) < 5):
+        if setup is not None:
+            setup()
+        start = time.perf_counter_ns()
+        func()
+        timings.append(time.perf_counter_ns() - start)
+    timings.sort()
+    total = sum(timings)
+    return {
+        'case': name,
+        'coins': coins,
+        'iterations': len(timings),
+        'ops_per_sec': round(len(timings) / (total / 1e9), 1) if total else None,
+        'mean_us': round(total / len(timings) / 1000, 3),
+        'p50_us': round(percentile(timings, 0.50) / 1000, 3),
+        'p99_us': round(percentile(timings, 0.99) / 1000, 3),
+    }
+
+
+def make_chatbot(universe: List[dict], api_url: str) -> CryptoChatbot:
+    """A chatbot loaded with the universe, with all network refreshes switched off"""
+    chatbot = CryptoChatbot(snapshot_path=None, nlp_backend='builtin', history_path=None)
+    chatbot.api_url = api_url
+    chatbot.coin_ids = [coin['id'] for coin in universe]
+    chatbot.auto_refresh = False
+    chatbot.requests_per_second = None  # The local stand-in has no rate limit
+    chatbot.crypto_data = {coin['id']: coin for coin in universe}
+    chatbot.last_update = datetime.now()
+    chatbot.data_source = 'live'
+    chatbot.preload()
+    return chatbot
+
+
+def run_size(size: int, min_time: float, max_iterations: int, fetch_iterations: int) -> List[dict]:
+    """Run every benchmark case against a synthetic universe of the given size"""
+    universe = synthetic_universe(size)
+    results = []
+
+    def run(name, func, setup=None, iterations=max_iterations):
+        result = measure(name, size, func, min_time, iterations, setup)
+        results.append(result)
+        print(f"  {name:<38} {result['ops_per_sec']:>12,.1f} ops/s  "
+              f"p50 {result['p50_us']:>10,.1f}us  p99 {result['p99_us']:>10,.1f}us",
+              file=sys.stderr)
+
+    with FakeCoinGecko(universe) as server:
+        chatbot = make_chatbot(universe, server.url)
+        queries = list(INTENT_QUERIES.values())
+
+        # Query analysis, with and without the normalized-query cache
+        position = [0]
+
+        def analyze_next():
+            position[0] = (position[0] + 1) % len(queries)
+            chatbot.analyze_query(queries[position[0]])
+        run('analyze_query', analyze_next, setup=chatbot.intent_cache.clear)
+        run('analyze_query[cached]', analyze_next)
+
+        # Each respond_to_query branch, cold (caches cleared) and warm
+        def clear_caches():
+            chatbot.intent_cache.clear()
+            chatbot.response_cache.clear()
+        for intent, query in INTENT_QUERIES.items():
+            run(f'respond_to_query[{intent}]', lambda query=query: chatbot.respond_to_query(query),
+                setup=clear_caches)
+            run(f'respond_to_query[{intent},cached]', lambda query=query: chatbot.respond_to_query(query))
+
+        # Coin lookup through the prebuilt index, exact and misspelled
+        matcher = chatbot.get_coin_matcher()
+        run('coin_lookup', lambda: matcher.find("what is the ethereum price"))
+        run('coin_lookup[typo]', lambda: matcher.find("what is the etherium price"))
+        # Misspelled members of a large name family, and a family word matching no one coin
+        run('coin_lookup[typo,family]', lambda: matcher.find("sinthcoin 123 price"))
+        run('coin_lookup[typo,family,digit]', lambda: matcher.find("is synthc0in 99 up"))
+        run('coin_lookup[family,ambiguous]', lambda: matcher.find("how is synthcoin doing"))
+
+        run('get_trending_cryptos', chatbot.get_trending_cryptos)
+        run('get_sustainable_cryptos', chatbot.get_sustainable_cryptos)
+
+        # Per-refresh cost of a full store rebuild versus applying a small delta
+        run('rebuild_market_store', lambda: MarketStore(chatbot.crypto_data, chatbot.sustainability_scores))
+        # Scoring the whole universe from metadata, as done when the metadata file changes
+        consensus = sorted(CONSENSUS_SCORES)
+        metadata = {coin['id']: {'consensus': consensus[row % len(consensus)],
+                                 'energy_kwh_per_tx': 10.0 ** (row % 7 - 4)}
+                    for row, coin in enumerate(universe)}
+        run('compute_sustainability_scores', lambda: compute_scores(metadata))
+        tick = [0]
+
+        def price_tick():
+            # Move the price and 24h change of ~1% of the coins, as a typical refresh does
+            tick[0] += 1
+            moved = dict(chatbot.crypto_data)
+            for crypto_id in list(moved)[tick[0] % min(100, len(moved))::100]:
+                coin = dict(moved[crypto_id])
+                coin['current_price'] = (coin.get('current_price') or 1) * 1.001
+                coin['price_change_percentage_24h'] = (coin.get('price_change_percentage_24h') or 0) + 0.1
+                moved[crypto_id] = coin
+            chatbot.crypto_data = moved
+        run('apply_delta[1%]', price_tick)
+
+        # Network fetch against the local stand-in
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            run('fetch_crypto_data', chatbot.fetch_crypto_data, iterations=fetch_iterations)
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: List[dict], baseline_path: str):
+    """Print the throughput change of each case relative to a saved run"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {(r['case'], r['coins']): r for r in json.load(f)['results']}
+    print(f"\nCompared with {baseline_path}:", file=sys.stderr)
+    for result in results:
+        old = baseline.get((result['case'], result['coins']))
+        if old and old['ops_per_sec'] and result['ops_per_sec']:
+            ratio = result['ops_per_sec'] / old['ops_per_sec']
+            print(f"  {result['case']:<38} {result['coins']:>6} coins  {ratio:6.2f}x", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the chatbot hot paths against a local CoinGecko stand-in")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="coin universe sizes")
+    parser.add_argument('--min-time', type=float, default=0.5, help="minimum seconds per case")
+    parser.add_argument('--max-iterations', type=int, default=100000, help="maximum calls per case")
+    parser.add_argument('--fetch-iterations', type=int, default=20, help="maximum fetch_crypto_data calls")
+    parser.add_argument('--output', help="write JSON results here instead of stdout")
+    parser.add_argument('--compare', metavar='BASELINE', help="JSON results of an earlier run to compare with")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        print(f"Universe of {size} coins:", file=sys.stderr)
+        results.extend(run_size(size, args.min_time, args.max_iterations, args.fetch_iterations))
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'min_time': args.min_time,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
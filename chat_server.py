@@ -0,0 +1,272 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from cryptobot import CryptoChatbot, parse_request
+
+DEFAULT_PORT = 8765
+
+
+def parse_line(line: str) -> dict:
+    """Parse a session line: an NDJSON request, or any other text as a plain query"""
+    if line[:1] in ('{', '"'):
+        return parse_request(line)
+    return {'query': line}
+
+
+def error_reply(request: dict, message: str, **extra) -> dict:
+    """An error reply, echoing the request id if it had one"""
+    reply = {'id': request['id']} if 'id' in request else {}
+    return {**reply, 'error': message, **extra}
+
+
+class ChatServer:
+    """Line-based chat sessions over TCP or a Unix socket, all answered by one CryptoChatbot
+
+    Each line a client sends is a query (plain text, or NDJSON as accepted by
+    --ndjson) and each reply is one JSON line, in request order. Queries from
+    every session go through one bounded queue; once it is full, new queries
+    get an immediate "busy" reply instead of waiting. A session stops being
+    read while pipeline_depth of its replies are pending or its socket buffer
+    is full, so a slow client only ever holds up itself. Batches are answered
+    on one worker thread, so a query waiting on a refresh never blocks the loop.
+    """
+
+    def __init__(self, chatbot: Optional[CryptoChatbot] = None, host: str = '127.0.0.1',
+                 port: int = DEFAULT_PORT, unix_path: Optional[str] = None, max_in_flight: int = 1024,
+                 pipeline_depth: int = 16, batch_size: int = 64, max_line: int = 4096,
+                 idle_timeout: Optional[float] = 300):
+        self.chatbot = chatbot or CryptoChatbot()
+        self.host = host
+        self.port = port
+        self.unix_path = unix_path
+        self.max_in_flight = max_in_flight
+        self.pipeline_depth = pipeline_depth
+        self.batch_size = batch_size
+        self.max_line = max_line
+        self.idle_timeout = idle_timeout
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.sessions = 0
+        self._dispatcher: Optional[asyncio.Task] = None
+        # Answering can wait on locks the refresher holds, so it runs off the event loop
+        self._answerer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cryptopal-answer')
+
+        metrics = self.chatbot.metrics
+        self.requests_total = metrics.counter(
+            'cryptopal_server_requests_total', "Server queries, by outcome", ('result',))
+        self.connections_total = metrics.counter(
+            'cryptopal_server_connections_total', "Client connections accepted")
+        metrics.register_collector(
+            'cryptopal_server_sessions', 'gauge', "Open client sessions",
+            lambda: [('cryptopal_server_sessions', {}, self.sessions)])
+        metrics.register_collector(
+            'cryptopal_server_queue_depth', 'gauge', "Queries waiting to be answered",
+            lambda: [('cryptopal_server_queue_depth', {}, self.queue.qsize() if self.queue else 0)])
+
+    @property
+    def address(self) -> str:
+        """Where clients can connect, with the actual port when port 0 was asked for"""
+        if self.unix_path:
+            return self.unix_path
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f"{host}:{port}"
+
+    async def start(self):
+        """Load data off the event loop, then start listening"""
+        loop = asyncio.get_running_loop()
+        # The first fetch can take seconds; later refreshes run on the refresher thread
+        await loop.run_in_executor(None, self.chatbot.warm_start)
+        await loop.run_in_executor(None, self.chatbot.preload)
+
+        self.queue = asyncio.Queue(self.max_in_flight)
+        self._dispatcher = asyncio.create_task(self._dispatch())
+        if self.unix_path:
+            if os.path.exists(self.unix_path):
+                os.unlink(self.unix_path)
+            self.server = await asyncio.start_unix_server(self._session, path=self.unix_path, limit=self.max_line)
+        else:
+            self.server = await asyncio.start_server(self._session, self.host, self.port, limit=self.max_line,
+                                                     backlog=1024)
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        """Stop accepting sessions, stop answering and stop the refresher"""
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+        self._answerer.shutdown(wait=True)
+        await asyncio.get_running_loop().run_in_executor(None, self.chatbot.stop_refresher)
+        if self.unix_path and os.path.exists(self.unix_path):
+            os.unlink(self.unix_path)
+
+    async def _dispatch(self):
+        """Answer queued queries in batches on the answer thread, one batch at a time"""
+        loop = asyncio.get_running_loop()
+        queue = self.queue
+        while True:
+            batch: List[Tuple[dict, float, asyncio.Future]] = [await queue.get()]
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            batch = [item for item in batch if not item[2].cancelled()]
+            if not batch:
+                continue
+            # Sessions keep reading, writing and shedding load while the batch is answered
+            replies = await loop.run_in_executor(
+                self._answerer, self._answer_batch, [(request, start) for request, start, _ in batch])
+            for (_, _, future), reply in zip(batch, replies):
+                if not future.cancelled():
+                    future.set_result(reply)
+
+    def _answer_batch(self, batch: List[Tuple[dict, float]]) -> List[dict]:
+        """Answer a batch of requests; runs on the answer thread"""
+        replies = []
+        for request, start in batch:
+            try:
+                replies.append(self.chatbot.answer_request(request, start))
+                self.requests_total.inc(result='ok')
+            except Exception as e:
+                replies.append(error_reply(request, f"Internal error: {e}"))
+                self.requests_total.inc(result='error')
+        return replies
+
+    async def _session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Read queries from one client and hand them to the writer in order"""
+        self.sessions += 1
+        self.connections_total.inc()
+        writer.transport.set_write_buffer_limits(high=64 * 1024)
+        pending: asyncio.Queue = asyncio.Queue(self.pipeline_depth)
+        replies = asyncio.create_task(self._write_replies(pending, writer))
+        try:
+            while not replies.done():
+                try:
+                    line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+                except (asyncio.TimeoutError, ConnectionError):
+                    break
+                except ValueError:
+                    # Line longer than max_line; the stream can't be resynchronized
+                    await self._hand_over(pending, {'error': f"Line too long (limit {self.max_line} bytes)"},
+                                          replies)
+                    break
+                if not line:
+                    break
+                text = line.decode('utf-8', 'replace').strip()
+                if text:
+                    # Waits while pipeline_depth replies are queued: backpressure on this client only
+                    await self._hand_over(pending, self._submit(text), replies)
+            await self._hand_over(pending, None, replies)
+            await replies
+        except ConnectionError:
+            pass
+        finally:
+            # The client went away: drop whatever it was still waiting for
+            while not pending.empty():
+                item = pending.get_nowait()
+                if isinstance(item, asyncio.Future):
+                    item.cancel()
+            replies.cancel()
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+            self.sessions -= 1
+
+    @staticmethod
+    async def _hand_over(pending: asyncio.Queue, item, replies: asyncio.Task):
+        """Queue an item for the session writer, giving up if the writer has stopped"""
+        try:
+            pending.put_nowait(item)
+            return
+        except asyncio.QueueFull:
+            pass
+        put = asyncio.ensure_future(pending.put(item))
+        await asyncio.wait((put, replies), return_when=asyncio.FIRST_COMPLETED)
+        if not put.done():
+            put.cancel()
+            if isinstance(item, asyncio.Future):
+                item.cancel()
+            raise ConnectionError("Session writer stopped")
+
+    def _submit(self, text: str):
+        """Queue a query for the dispatcher, or return an immediate reply if it can't be"""
+        try:
+            request = parse_line(text)
+        except (ValueError, KeyError, TypeError) as e:
+            self.requests_total.inc(result='invalid')
+            return {'error': f"Invalid request: {e}"}
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((request, time.perf_counter(), future))
+        except asyncio.QueueFull:
+            self.requests_total.inc(result='shed')
+            return error_reply(request, "Server busy, please retry", busy=True)
+        return future
+
+    async def _write_replies(self, pending: asyncio.Queue, writer: asyncio.StreamWriter):
+        """Write each reply as soon as it and every reply before it are ready"""
+        while True:
+            item = await pending.get()
+            if item is None:
+                return
+            reply = await item if isinstance(item, asyncio.Future) else item
+            writer.write(json.dumps(reply).encode('utf-8') + b'\n')
+            # Waits while the client isn't reading, which in turn stops this session's reader
+            await writer.drain()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve Cryptopal chat sessions over TCP or a Unix socket")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', metavar='PATH', help="listen on a Unix socket instead of TCP")
+    parser.add_argument('--max-in-flight', type=int, default=1024,
+                        help="queued queries across all sessions before new ones are turned away")
+    parser.add_argument('--pipeline-depth', type=int, default=16,
+                        help="unanswered queries per session before it stops being read")
+    args = parser.parse_args()
+
+    server = ChatServer(host=args.host, port=args.port, unix_path=args.unix,
+                        max_in_flight=args.max_in_flight, pipeline_depth=args.pipeline_depth)
+
+    async def run():
+        await server.start()
+        print(f"💬 Cryptopal chat server listening on {server.address}")
+        serving = asyncio.ensure_future(server.serve_forever())
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                asyncio.get_running_loop().add_signal_handler(sig, serving.cancel)
+            except (NotImplementedError, AttributeError):
+                pass  # No signal handlers on Windows event loops; Ctrl+C still works
+        try:
+            await serving
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await server.close()
+            print("👋 Chat server stopped")
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
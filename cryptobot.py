@@ -1,46 +1,152 @@
+import argparse
+import json
+import os
 import requests
-import nltk
+import sys
 import time
 import ssl
+import threading
 import urllib3
+from contextlib import redirect_stdout
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterable, List, Optional, TextIO, Tuple
 
 # Disable SSL warnings for development (remove in production)
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-# Download required NLTK data
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
+from fx_rates import BASE_CURRENCY, CURRENCIES, FxRates, format_market_cap, format_price, parse_exchange_rates
+from intent_index import CoinMatcher, IntentIndex, coin_patterns
+from market_fetcher import MarketFetcher, TokenBucket, describe_error
+from metrics import MetricsRegistry, SamplingProfiler
+from market_store import (SUSTAINABLE_THRESHOLD, VIEW_NAMES, CurrencyView, MarketDelta, MarketStore, changed_views,
+                          compute_delta)
+from nlp import DEFAULT_BACKEND, QueryNormalizer
+from price_history import DEFAULT_HISTORY_PATH, PriceHistory
+from refresher import DataRefresher
+from response_cache import CachedResponse, LRUCache
+from rule_engine import Rule, RuleEngine, RuleResults
+from snapshot_cache import DEFAULT_SNAPSHOT_PATH, load_snapshot, save_snapshot
+from sustainability import DEFAULT_METADATA_PATH, SustainabilityScores
 
-try:
-    nltk.data.find('corpora/wordnet')
-except LookupError:
-    nltk.download('wordnet')
+# Reply rules in priority order: the first rule a query's intents trigger picks the reply.
+# Rules other than these are answered with a plain list of their matches.
+ADVICE_RULES = (
+    Rule('greeting', intents=['greeting']),
+    Rule('sustainable', intents=['sustainable'], when=[('sustainability', '>=', SUSTAINABLE_THRESHOLD)],
+         order_by='sustainability', limit=3),
+    Rule('trending', intents=['trending'], when=[('change_24h', '>', 0)], order_by='change_24h', limit=5),
+    Rule('price', intents=['price'], order_by='rank', descending=False, limit=5),
+    Rule('market', intents=['market'], order_by='market_cap', limit=5),
+    # Sustainable coins among the top five gainers
+    Rule('profit', intents=['profit'], when=[('gain_rank', '<', 5), ('sustainability', '>=', SUSTAINABLE_THRESHOLD)],
+         order_by='change_24h', limit=3),
+)
 
-from nltk.tokenize import word_tokenize
-from nltk.stem import WordNetLemmatizer
+# Ranked view each reply branch reads, for invalidating cached replies
+BRANCH_VIEWS = {
+    'sustainable': 'sustainable',
+    'trending': 'gainers',
+    'price': 'by_rank',
+    'market': 'by_market_cap',
+    'profit': 'trending_sustainable',
+}
+
+# Views a trending reply can read: the 24h gainers, or momentum over trend_window
+TRENDING_VIEWS = frozenset(['gainers', 'momentum'])
+
+# Timed stages of answering a query and refreshing data
+STAGES = ('query', 'tokenize', 'lemmatize', 'intent_match', 'format', 'ranking', 'refresh')
+
+def parse_request(line: str) -> dict:
+    """Parse an NDJSON request line: a JSON string, or an object with a query, an optional id
+    and an optional reply currency"""
+    request = json.loads(line)
+    if isinstance(request, str):
+        request = {'query': request}
+    query = request['query']
+    if not isinstance(query, str):
+        raise TypeError("query must be a string")
+    currency = request.get('currency')
+    if currency is not None and currency not in CURRENCIES:
+        raise ValueError(f"unsupported currency {currency!r}, expected one of {', '.join(CURRENCIES)}")
+    return request
 
 class CryptoChatbot:
-    def __init__(self):
-        self.lemmatizer = WordNetLemmatizer()
-        self.crypto_data = {}
+    def __init__(self, snapshot_path: Optional[str] = DEFAULT_SNAPSHOT_PATH,
+                 nlp_backend: str = DEFAULT_BACKEND, history_path: Optional[str] = DEFAULT_HISTORY_PATH,
+                 sustainability_path: Optional[str] = DEFAULT_METADATA_PATH):
+        # NLTK and WordNet are only loaded on the first query (or by preload())
+        self.normalizer = QueryNormalizer(nlp_backend)
+        self.intent_index = IntentIndex()
+        self._snapshot = (0, {})  # (data version, crypto_data), swapped as one unit
+        self._data_lock = threading.Lock()
+        self._subscribers: List[Callable[[MarketDelta], None]] = []
+        self._coin_matcher = None
+        self._coin_matcher_source = None
+        self._market_store = None
+        self._rule_engine = RuleEngine(ADVICE_RULES)
+        self._rule_results = None
         self.last_update = None
         self.update_interval = timedelta(minutes=5)  # Refresh every 5 minutes
+        self.auto_refresh = True  # Pool workers turn this off and follow a shared snapshot
+
+        # Last good market snapshot on disk, used to warm start (None disables it)
+        self.snapshot_path = snapshot_path
+        self.data_source = None  # 'live', 'snapshot' or 'fallback'
+
+        # Every live refresh is appended to a bounded per-coin price history (None keeps it in memory)
+        self.history_path = history_path
+        self.price_history = None
+        # Rank trending coins by momentum over this window of recorded history (e.g. '1h');
+        # None, or a window the history doesn't cover yet, uses CoinGecko's 24h change
+        self._trend_window: Optional[str] = None
+
+        # Background refresher and the pooled HTTP session used for every fetch
+        self.refresher = None
+        self.session = None
+
+        # CoinGecko endpoint (overridable to point at a local stand-in) and tracked coins
+        self.api_url = os.environ.get('COINGECKO_API_URL', "https://api.coingecko.com/api/v3")
+        # Prices are fetched in USD once and converted with cached exchange rates, refreshed hourly;
+        # replies use this currency unless the query or request names another
+        self.currency = BASE_CURRENCY
+        self.fx_rates = FxRates()
+        self.coin_ids = ['bitcoin', 'ethereum', 'cardano', 'solana', 'polygon', 'algorand', 'tezos', 'stellar']
+
+        # Large universes are fetched as concurrent pages of up to 250 ids, rate limited
+        # to stay inside CoinGecko's free tier (set requests_per_second to None to disable)
+        self.fetch_workers = 4
+        self.requests_per_second = 0.5
+        self.request_burst = 5
+        self.fetcher = None
+
+        # Normalized query -> keywords, and keywords -> rendered reply (CachedResponse)
+        self.intent_cache = LRUCache(4096)
+        self.response_cache = LRUCache(1024)
+
+        # Stage timings and counters; dump with metrics.to_prometheus() or metrics.to_json()
+        self.metrics = MetricsRegistry()
+        self.stage_seconds = self.metrics.histogram(
+            'cryptopal_stage_seconds', "Time spent in each query and refresh stage", ('stage',))
+        self.stage_timers = {stage: self.stage_seconds.labels(stage=stage) for stage in STAGES}
+        self.refresh_total = self.metrics.counter(
+            'cryptopal_refresh_total', "Market data refreshes, by outcome", ('result',))
+        self.fallback_total = self.metrics.counter(
+            'cryptopal_fallback_total', "Switches to the built-in fallback data")
+        self.fx_refresh_total = self.metrics.counter(
+            'cryptopal_fx_refresh_total', "Exchange rate refreshes, by outcome", ('result',))
+        self.metrics.register_collector(
+            'cryptopal_cache_requests_total', 'counter', "Cache lookups, by cache and result", self.cache_samples)
+        self.metrics.register_collector(
+            'cryptopal_data_age_seconds', 'gauge', "Age of the market data being served",
+            lambda: [('cryptopal_data_age_seconds', {'source': self.data_source or 'none'},
+                      (datetime.now() - self.last_update).total_seconds() if self.last_update else -1)])
+        # Sampling profiler, off until started (e.g. chatbot.profiler.toggle())
+        self.profiler = SamplingProfiler()
         
-        # Enhanced sustainability scores based on consensus mechanisms
-        self.sustainability_scores = {
-            'bitcoin': 2,      # Proof of Work - high energy
-            'ethereum': 7,     # Proof of Stake - much improved
-            'cardano': 9,      # Proof of Stake - very efficient
-            'solana': 8,       # Proof of History/Stake - efficient
-            'polygon': 8,      # Layer 2 solution - efficient
-            'algorand': 9,     # Pure Proof of Stake - carbon neutral
-            'tezos': 8,        # Liquid Proof of Stake - efficient
-            'stellar': 9,      # Stellar Consensus Protocol - very efficient
-        }
+        # Sustainability scores derived from coin metadata (consensus mechanism, energy per
+        # transaction), recomputed when the metadata file changes
+        self.sustainability = SustainabilityScores(sustainability_path)
         
         # Enhanced fallback data with realistic structure
         self.fallback_data = {
@@ -100,6 +206,163 @@ class CryptoChatbot:
             }
         }
 
+    @property
+    def rule_engine(self) -> RuleEngine:
+        return self._rule_engine
+
+    @rule_engine.setter
+    def rule_engine(self, rule_engine: RuleEngine):
+        """Swap the reply rules, dropping matches and replies from the old ones"""
+        with self._data_lock:
+            self._rule_engine = rule_engine
+            self._rule_results = None
+            self.response_cache.clear()
+
+    @property
+    def trend_window(self) -> Optional[str]:
+        return self._trend_window
+
+    @trend_window.setter
+    def trend_window(self, trend_window: Optional[str]):
+        """Switch the trending ranking, dropping trending replies ranked the old way"""
+        with self._data_lock:
+            self._trend_window = trend_window
+            self.response_cache.discard_where(lambda key, entry: not entry.views.isdisjoint(TRENDING_VIEWS))
+
+    @property
+    def sustainability_scores(self) -> Dict[str, float]:
+        return self.sustainability.scores
+
+    @property
+    def crypto_data(self) -> Dict[str, dict]:
+        return self._snapshot[1]
+
+    @crypto_data.setter
+    def crypto_data(self, crypto_data: Dict[str, dict]):
+        self.replace_crypto_data(crypto_data)
+
+    def replace_crypto_data(self, crypto_data: Dict[str, dict], delta: Optional[MarketDelta] = None):
+        """Swap in a new snapshot and update derived structures from its per-coin delta
+
+        delta must describe the change from the current snapshot; it is computed
+        when not given. Subscribers are notified once the swap is complete.
+        """
+        with self._data_lock:
+            version, previous = self._snapshot
+            if delta is None:
+                delta = compute_delta(previous, crypto_data)
+            delta.version = version + 1
+            self._snapshot = (version + 1, crypto_data)
+            self._apply_delta(previous, crypto_data, delta)
+        if delta:
+            for callback in list(self._subscribers):
+                try:
+                    callback(delta)
+                except Exception as e:
+                    print(f"⚠️ Market data subscriber failed: {e}")
+
+    def _apply_delta(self, previous: Dict[str, dict], crypto_data: Dict[str, dict], delta: MarketDelta):
+        """Patch the market store, coin matcher and reply cache for a snapshot swap"""
+        store = self._market_store
+        with self.stage_timers['ranking'].time():
+            if store is not None and store.coins is previous \
+                    and store.sustainability_scores is self.sustainability_scores:
+                new_store = store.apply(crypto_data, delta)
+                views = changed_views(store, new_store)
+            else:
+                new_store = MarketStore(crypto_data, self.sustainability_scores)
+                views = frozenset(VIEW_NAMES)
+        self._market_store = new_store
+
+        # Price moves don't change coin names, so the coin index carries over as is
+        if self._coin_matcher_source is previous and not delta.renames_coins:
+            self._coin_matcher_source = crypto_data
+
+        # Only replies showing a changed coin or reading a reshuffled ranking go stale;
+        # replies from other rules are dropped whenever any coin changes
+        touched = delta.touched
+        if touched:
+            views |= {'rules'}
+        if touched or views:
+            self.response_cache.discard_where(
+                lambda key, entry: not entry.coins.isdisjoint(touched) or not entry.views.isdisjoint(views))
+
+    def subscribe(self, callback: Callable[[MarketDelta], None]) -> Callable[[], None]:
+        """Call callback with a MarketDelta after every data change; returns an unsubscribe function
+
+        Callbacks run on the thread that swapped the data (usually the refresher),
+        so pass e.g. queue.Queue.put_nowait to consume changes as a stream elsewhere.
+        """
+        self._subscribers.append(callback)
+        return lambda: self._subscribers.remove(callback)
+
+    def refresh_fx_rates(self, quiet: bool = False) -> bool:
+        """Fetch exchange rates if they are due, keeping the last good ones on failure"""
+        if not self.fx_rates.due():
+            return False
+        try:
+            rates = parse_exchange_rates(self.get_fetcher().fetch_exchange_rates())
+        except (requests.exceptions.RequestException, ValueError, KeyError, TypeError) as e:
+            self.fx_rates.failed()
+            self.fx_refresh_total.inc(result='error')
+            if not quiet:
+                print(f"⚠️ Could not refresh exchange rates: {e}")
+            return False
+        changed = self.fx_rates.update(rates)
+        self.fx_refresh_total.inc(result='success')
+        if changed:
+            # Converted price strings are rebuilt on next use; only replies in those currencies go stale
+            stale = {f'fx_{currency}' for currency in changed}
+            self.response_cache.discard_where(lambda key, entry: not entry.views.isdisjoint(stale))
+        return bool(changed)
+
+    def resolve_currency(self, keywords: set, requested: Optional[str] = None) -> Tuple[str, str]:
+        """Reply currency for a query, and a note if it had to fall back to USD
+
+        A currency named in the query wins over the request's, then the chatbot default.
+        """
+        currency = requested or self.currency
+        for keyword in keywords:
+            if keyword.startswith('currency_'):
+                currency = keyword[len('currency_'):]
+                break
+        if self.fx_rates.rate(currency) is None:
+            return BASE_CURRENCY, f"\n\n💱 No {currency.upper()} exchange rate yet, so prices are in USD."
+        return currency, ""
+
+    @staticmethod
+    def with_currency_note(response: str, currency_note: str) -> str:
+        """Append a currency fallback note, without the blank line a list reply's last newline would add"""
+        return response.rstrip() + currency_note if currency_note else response
+
+    def get_currency_view(self, currency: str = BASE_CURRENCY,
+                          crypto_data: Optional[Dict[str, dict]] = None) -> CurrencyView:
+        """Converted and formatted prices of a snapshot in one currency"""
+        return self.get_market_store(crypto_data).currency_view(currency, self.fx_rates.rate(currency))
+
+    def refresh_sustainability(self, quiet: bool = False) -> bool:
+        """Rescore coins if the metadata file changed, rebuilding the sustainability column"""
+        if not self.sustainability.reload(force=False, quiet=quiet):
+            return False
+        with self._data_lock:
+            crypto_data = self.crypto_data
+            with self.stage_timers['ranking'].time():
+                self._market_store = MarketStore(crypto_data, self.sustainability_scores)
+            # Any reply may show a score; metadata changes are rare enough to start over
+            self.response_cache.clear()
+        return True
+
+    @property
+    def data_version(self) -> int:
+        return self._snapshot[0]
+
+    def preload(self):
+        """Load NLP models and build indexes up front, e.g. in a worker pre-fork hook"""
+        self.normalizer.load()
+        if self.crypto_data:
+            self.get_market_store()
+            self.get_coin_matcher()
+
     def greet(self):
         print("🤖 Hi, I'm Cryptopal — your friendly crypto advisor! 🚀")
         print("I can help you with:")
@@ -109,54 +372,189 @@ class CryptoChatbot:
         print("• 📊 Market cap rankings")
         print("\nTry asking: 'What's trending?' or 'Which crypto is most sustainable?'")
 
-    def fetch_crypto_data(self) -> bool:
-        """Fetch real-time crypto data from CoinGecko API"""
+    def fetch_crypto_data(self, quiet: bool = False) -> bool:
+        """Fetch real-time crypto data from CoinGecko API
+
+        quiet skips the status lines, for background refreshes that would print them into
+        the middle of the chat prompt; their outcomes are still counted in the metrics.
+        """
+        with self.stage_timers['refresh'].time():
+            return self._fetch_crypto_data(quiet)
+
+    def _fetch_crypto_data(self, quiet: bool) -> bool:
+        self.refresh_sustainability(quiet)
         try:
-            url = "https://api.coingecko.com/api/v3/coins/markets"
-            params = {
-                'vs_currency': 'usd',
-                'ids': 'bitcoin,ethereum,cardano,solana,polygon,algorand,tezos,stellar',
-                'order': 'market_cap_desc',
-                'per_page': 10,
-                'page': 1,
-                'sparkline': False,
-                'price_change_percentage': '24h'
-            }
-            
-            # Multiple approaches to handle SSL issues
-            session = requests.Session()
-            
-            # Try with normal SSL verification first
-            try:
-                response = session.get(url, params=params, timeout=10)
-                response.raise_for_status()
-            except requests.exceptions.SSLError:
-                # If SSL fails, try without verification (development only)
-                print("🔒 SSL verification issue detected, trying alternative approach...")
-                response = session.get(url, params=params, timeout=10, verify=False)
-                response.raise_for_status()
-            
-            data = response.json()
-            self.crypto_data = {coin['id']: coin for coin in data}
+            # Pages are merged as they arrive; coins on pages that fail keep their last
+            # good values, and a snapshot that came from fallback data is never mixed in
+            merged = dict(self.crypto_data) if self.data_source in ('live', 'snapshot') else {}
+
+            def merge_page(coins: List[dict]):
+                nonlocal merged
+                # Copy-on-write: readers holding the previous dict never see it change
+                base = merged
+                merged = {**base, **{coin['id']: coin for coin in coins}}
+                # Diff just this page when merging onto the data being served
+                delta = compute_delta(base, merged, ids=[coin['id'] for coin in coins]) \
+                    if base is self.crypto_data else None
+                self.replace_crypto_data(merged, delta)
+
+            result = self.get_fetcher().fetch(self.coin_ids, on_page=merge_page)
+            if result.insecure and not quiet:
+                print("🔒 SSL verification issue detected, fetched without verification instead.")
+            if not result.pages_ok:
+                raise result.errors[-1] if result.errors else ValueError("No coin ids to fetch")
+
+            # Final swap: drop untracked coins and restore market cap order
+            tracked = set(self.coin_ids)
+            ordered = sorted((coin for crypto_id, coin in merged.items() if crypto_id in tracked),
+                             key=lambda coin: coin.get('market_cap_rank') or float('inf'))
+            untracked = [crypto_id for crypto_id in merged if crypto_id not in tracked]
+            fresh = {coin['id']: coin for coin in ordered}
             self.last_update = datetime.now()
+            self.record_history(fresh, self.last_update)
+            self.replace_crypto_data(fresh, MarketDelta(removed=untracked) if merged is self.crypto_data else None)
+            self.data_source = 'live'
+            self.save_snapshot(quiet)
+
+            # Build the coin matcher and price strings here so the first query after a refresh doesn't pay for them
+            self.get_coin_matcher()
+            self.refresh_fx_rates(quiet)
+            for currency in self.fx_rates.rates:
+                self.get_currency_view(currency)
             
-            print("✅ Live crypto data loaded successfully!")
+            self.refresh_total.inc(result='success' if result.complete else 'partial')
+            if not quiet and result.complete:
+                print("✅ Live crypto data loaded successfully!")
+            elif not quiet:
+                failures = ', '.join(f"page {page}: {describe_error(error)}"
+                                     for page, error in sorted(zip(result.failed_pages, result.errors)))
+                print(f"⚠️ Live crypto data partially loaded: {len(result.errors)} page(s) failed "
+                      f"({failures}), keeping previous values for those coins.")
             return True
             
         except requests.exceptions.RequestException as e:
             if "SSL" in str(e) or "certificate" in str(e).lower():
-                print("🔒 SSL Certificate issue detected.")
-                print("💡 This is common on some networks. Using reliable fallback data.")
+                self.refresh_total.inc(result='ssl_error')
+                if not quiet:
+                    print("🔒 SSL Certificate issue detected.")
+                self.use_fallback_data("💡 This is common on some networks. Using reliable fallback data.", quiet)
             else:
-                print(f"⚠️ API Error: {e}")
-                print("📋 Using fallback data instead.")
-            self.crypto_data = self.fallback_data
+                self.refresh_total.inc(result='api_error')
+                if not quiet:
+                    print(f"⚠️ API Error: {e}")
+                self.use_fallback_data("📋 Using fallback data instead.", quiet)
             return False
         except Exception as e:
-            print(f"⚠️ Unexpected error: {e}")
-            print("📋 Using fallback data instead.")
-            self.crypto_data = self.fallback_data
+            self.refresh_total.inc(result='error')
+            if not quiet:
+                print(f"⚠️ Unexpected error: {e}")
+            self.use_fallback_data("📋 Using fallback data instead.", quiet)
+            return False
+
+    def get_fetcher(self) -> MarketFetcher:
+        """Get the paginated market fetcher, creating it on first use"""
+        if self.fetcher is None:
+            rate_limiter = None
+            if self.requests_per_second:
+                rate_limiter = TokenBucket(self.requests_per_second, self.request_burst)
+            self.fetcher = MarketFetcher(self.get_session(), self.api_url, max_workers=self.fetch_workers,
+                                         rate_limiter=rate_limiter, metrics=self.metrics)
+        return self.fetcher
+
+    def get_session(self) -> requests.Session:
+        """Get the shared keep-alive HTTP session, creating it on first use"""
+        if self.session is None:
+            self.session = requests.Session()
+        return self.session
+
+    def get_price_history(self) -> PriceHistory:
+        """Get the price history, loading it from disk on first use"""
+        if self.price_history is None:
+            self.price_history = PriceHistory(self.history_path)
+        return self.price_history
+
+    def record_history(self, crypto_data: Dict[str, dict], fetched_at: datetime):
+        """Append a live refresh to the price history"""
+        covered = self.trending_movers(crypto_data) is not None
+        if self.get_price_history().record(crypto_data, fetched_at):
+            # Momentum rankings moved even for coins whose price didn't, and once the history
+            # covers trend_window (or stops covering it) trending switches ranking altogether
+            stale = TRENDING_VIEWS if (self.trending_movers(crypto_data) is not None) != covered \
+                else frozenset(['momentum'])
+            self.response_cache.discard_where(lambda key, entry: not entry.views.isdisjoint(stale))
+
+    def trending_movers(self, crypto_data: Dict[str, dict]) -> Optional[List[Tuple[str, float]]]:
+        """Top (id, momentum %) over trend_window, or None to rank by the 24h change instead"""
+        if not self.trend_window or self.price_history is None:
+            return None
+        return self.price_history.top_movers(self.trend_window, 5, among=crypto_data)
+
+    def use_fallback_data(self, message: Optional[str] = None, quiet: bool = False):
+        """Switch to fallback data unless live or snapshot data can still be served"""
+        if self.data_source in ('live', 'snapshot'):
+            if message and not quiet:
+                print("📋 Keeping the last good data until the next refresh.")
+            return
+        if message and not quiet:
+            print(message)
+        self.fallback_total.inc()
+        self.crypto_data = self.fallback_data
+        self.data_source = 'fallback'
+
+    def save_snapshot(self, quiet: bool = False):
+        """Persist the current live data as the warm-start snapshot"""
+        if not self.snapshot_path:
+            return
+        try:
+            save_snapshot(self.snapshot_path, self.crypto_data, self.last_update)
+        except OSError as e:
+            if not quiet:
+                print(f"⚠️ Could not save market snapshot: {e}")
+
+    def load_snapshot(self) -> bool:
+        """Load the last saved snapshot so queries can be answered immediately"""
+        if not self.snapshot_path:
             return False
+        snapshot = load_snapshot(self.snapshot_path)
+        if snapshot is None:
+            return False
+        self.crypto_data, self.last_update = snapshot
+        self.data_source = 'snapshot'
+        return True
+
+    def warm_start(self):
+        """Serve the saved snapshot at once and keep data fresh in the background"""
+        if not self.load_snapshot():
+            self.fetch_crypto_data()
+        self.start_refresher()
+
+    def start_refresher(self):
+        """Start the background refresher, timed to the age of the current data"""
+        if self.refresher is None:
+            # Background refreshes report through the metrics, not into the chat prompt
+            self.refresher = DataRefresher(lambda: self.fetch_crypto_data(quiet=True),
+                                           self.update_interval.total_seconds())
+        self.refresher.start(initial_delay=self.seconds_until_refresh())
+
+    def stop_refresher(self):
+        """Stop the background refresher if it is running"""
+        if self.refresher is not None:
+            self.refresher.stop(timeout=1)
+
+    def refresh_in_progress(self) -> bool:
+        """Check if a background refresh is currently running"""
+        return self.refresher is not None and self.refresher.refreshing
+
+    def seconds_until_refresh(self) -> float:
+        """Seconds until the current data reaches the refresh interval"""
+        if not self.last_update:
+            return 0.0
+        remaining = self.last_update + self.update_interval - datetime.now()
+        return max(0.0, remaining.total_seconds())
+
+    def is_data_stale(self) -> bool:
+        """Check if answers are coming from data older than the refresh interval"""
+        return self.data_source in ('live', 'snapshot') and self.should_refresh_data()
 
     def should_refresh_data(self) -> bool:
         """Check if data needs refreshing"""
@@ -165,194 +563,295 @@ class CryptoChatbot:
         return datetime.now() - self.last_update > self.update_interval
 
     def get_fresh_data(self):
-        """Get fresh data if needed"""
-        if self.should_refresh_data():
-            self.fetch_crypto_data()
+        """Make sure a refresh is scheduled if needed, without waiting on the network"""
+        if not self.crypto_data:
+            self.use_fallback_data()
+        if self.auto_refresh and self.should_refresh_data():
+            self.start_refresher()
+
+    def get_coin_matcher(self) -> CoinMatcher:
+        """Get the coin name index, rebuilding it when the coin list changes"""
+        crypto_data = self.crypto_data
+        if self._coin_matcher_source is not crypto_data:
+            if self._coin_matcher is None or self._coin_matcher.patterns != coin_patterns(crypto_data):
+                self._coin_matcher = CoinMatcher(crypto_data)
+                self.intent_cache.clear()
+            self._coin_matcher_source = crypto_data
+        return self._coin_matcher
+
+    def cache_samples(self) -> List[tuple]:
+        """Hit/miss counters of the query caches, for the metrics registry"""
+        samples = []
+        for name, cache in (('intent', self.intent_cache), ('response', self.response_cache)):
+            stats = cache.stats()
+            samples.append(('cryptopal_cache_requests_total', {'cache': name, 'result': 'hit'}, stats['hits']))
+            samples.append(('cryptopal_cache_requests_total', {'cache': name, 'result': 'miss'}, stats['misses']))
+        return samples
 
     def analyze_query(self, query: str) -> set:
         """Enhanced query analysis with better keyword detection"""
-        tokens = word_tokenize(query.lower())
-        lemmas = [self.lemmatizer.lemmatize(token) for token in tokens]
-        
-        keywords = set()
-        
-        # Greeting detection
-        greeting_words = ['hi', 'hello', 'hey', 'good', 'morning', 'afternoon', 'evening']
-        if any(word in lemmas for word in greeting_words):
-            keywords.add('greeting')
-        
-        # Sustainability keywords
-        sustainability_words = ['sustainable', 'sustainability', 'green', 'eco', 'environment', 'carbon', 'energy']
-        if any(word in lemmas for word in sustainability_words):
-            keywords.add('sustainable')
-        
-        # Trending keywords
-        trend_words = ['trend', 'trending', 'hot', 'popular', 'rising', 'up', 'gaining']
-        if any(word in lemmas for word in trend_words):
-            keywords.add('trending')
-        
-        # Price keywords
-        price_words = ['price', 'cost', 'value', 'worth', 'expensive', 'cheap']
-        if any(word in lemmas for word in price_words):
-            keywords.add('price')
-        
-        # Profit/investment keywords
-        profit_words = ['profit', 'profitable', 'investment', 'invest', 'growth', 'gain', 'return']
-        if any(word in lemmas for word in profit_words):
-            keywords.add('profit')
-        
-        # Market cap keywords
-        market_words = ['market', 'cap', 'capitalization', 'size', 'big', 'large', 'top']
-        if any(word in lemmas for word in market_words):
-            keywords.add('market')
-        
-        # Specific crypto mentions
-        for crypto_id in self.crypto_data.keys():
-            crypto_name = self.crypto_data[crypto_id]['name'].lower()
-            crypto_symbol = self.crypto_data[crypto_id]['symbol'].lower()
-            if crypto_id in query.lower() or crypto_name in query.lower() or crypto_symbol in query.lower():
+        coin_matcher = self.get_coin_matcher()
+        normalized = ' '.join(query.lower().split())
+        cached = self.intent_cache.get(normalized)
+        if cached is not None:
+            return set(cached)
+
+        with self.stage_timers['tokenize'].time():
+            tokens = self.normalizer.tokenize(normalized)
+        with self.stage_timers['lemmatize'].time():
+            lemmas = self.normalizer.lemmatize(tokens)
+
+        with self.stage_timers['intent_match'].time():
+            keywords = self.intent_index.match(lemmas)
+
+            # Specific crypto mentions
+            for crypto_id in coin_matcher.find(normalized):
                 keywords.add(f'specific_{crypto_id}')
         
+        self.intent_cache.put(normalized, frozenset(keywords))
         return keywords
 
-    def get_trending_cryptos(self) -> List[str]:
-        """Get cryptocurrencies with positive 24h change"""
-        trending = []
-        for crypto_id, data in self.crypto_data.items():
-            change = data.get('price_change_percentage_24h', 0)
-            if change > 0:
-                trending.append((crypto_id, change))
-        
-        # Sort by percentage change
-        trending.sort(key=lambda x: x[1], reverse=True)
-        return [crypto[0] for crypto in trending[:5]]
+    def get_market_store(self, crypto_data: Optional[Dict[str, dict]] = None) -> MarketStore:
+        """Get the columnar store for a snapshot; the current one is kept up to date on every swap"""
+        if crypto_data is None:
+            crypto_data = self.crypto_data
+        store = self._market_store
+        if store is not None and store.coins is crypto_data:
+            return store
+        with self.stage_timers['ranking'].time():
+            store = MarketStore(crypto_data, self.sustainability_scores)
+        if crypto_data is self.crypto_data:
+            self._market_store = store
+        return store
+
+    def get_rule_results(self, crypto_data: Optional[Dict[str, dict]] = None) -> RuleResults:
+        """Rule matches for a snapshot, evaluated lazily and kept until the data changes"""
+        store = self.get_market_store(crypto_data)
+        cached = self._rule_results  # (store, engine, results)
+        if cached is not None and cached[0] is store and cached[1] is self.rule_engine:
+            return cached[2]
+        results = self.rule_engine.bind(store.columns, store.ids, store.ordering)
+        if store is self._market_store:
+            self._rule_results = (store, self.rule_engine, results)
+        return results
+
+    def screen(self, intents: Iterable[str], crypto_data: Optional[Dict[str, dict]] = None) -> Dict[str, List[str]]:
+        """Coin ids selected by every rule the intents trigger"""
+        return self.get_rule_results(crypto_data).screen(intents)
+
+    def get_trending_cryptos(self, crypto_data: Optional[Dict[str, dict]] = None) -> List[str]:
+        """Get cryptocurrencies with positive 24h change (or momentum over trend_window)"""
+        if crypto_data is None:
+            crypto_data = self.crypto_data
+        movers = self.trending_movers(crypto_data)
+        if movers is not None:
+            return [crypto_id for crypto_id, _ in movers]
+        return self.get_market_store(crypto_data).trending(5)
 
-    def get_sustainable_cryptos(self) -> List[tuple]:
+    def get_sustainable_cryptos(self, crypto_data: Optional[Dict[str, dict]] = None) -> List[tuple]:
         """Get most sustainable cryptocurrencies"""
-        sustainable = []
-        for crypto_id in self.crypto_data.keys():
-            score = self.sustainability_scores.get(crypto_id, 5)
-            if score >= 7:  # Only show highly sustainable ones
-                sustainable.append((crypto_id, score))
-        
-        sustainable.sort(key=lambda x: x[1], reverse=True)
-        return sustainable
+        return list(self.get_market_store(crypto_data).sustainable)
 
-    def format_price(self, price: float) -> str:
+    def format_price(self, price: float, currency: str = BASE_CURRENCY) -> str:
         """Format price nicely"""
-        if price >= 1:
-            return f"${price:,.2f}"
-        else:
-            return f"${price:.4f}"
+        return format_price(price, currency)
 
-    def format_market_cap(self, market_cap: float) -> str:
+    def format_market_cap(self, market_cap: float, currency: str = BASE_CURRENCY) -> str:
         """Format market cap in billions/millions"""
-        if market_cap >= 1_000_000_000:
-            return f"${market_cap/1_000_000_000:.1f}B"
-        elif market_cap >= 1_000_000:
-            return f"${market_cap/1_000_000:.1f}M"
-        else:
-            return f"${market_cap:,.0f}"
-
-    def respond_to_query(self, query: str) -> str:
+        return format_market_cap(market_cap, currency)
+
+    def respond_to_query(self, query: str, currency: Optional[str] = None) -> str:
         """Generate response based on query analysis"""
+        return self.answer_query(query, currency)[0]
+
+    def answer_query(self, query: str, currency: Optional[str] = None) -> Tuple[str, set, int, str]:
+        """Answer a query, also returning the detected keywords, the data version and the currency used"""
+        with self.stage_timers['query'].time():
+            self.get_fresh_data()
+            # Pin one snapshot so a concurrent refresh cannot change data mid-reply
+            data_version, crypto_data = self._snapshot
+            keywords = self.analyze_query(query)
+            currency, currency_note = self.resolve_currency(keywords, currency)
+            response = self.with_currency_note(
+                self.render_response(keywords, data_version, crypto_data, currency), currency_note) \
+                + self.staleness_note()
+        return response, keywords, data_version, currency
+
+    def respond_to_queries(self, queries: Iterable[str], currency: Optional[str] = None) -> List[str]:
+        """Answer a batch of queries against a single data snapshot"""
         self.get_fresh_data()
-        keywords = self.analyze_query(query)
+        data_version, crypto_data = self._snapshot
+        stale_note = self.staleness_note()
 
-        # Handle specific crypto queries
+        # Repeated queries within a batch are classified and rendered once
+        answered = {}
+        responses = []
+        for query in queries:
+            response = answered.get(query)
+            if response is None:
+                keywords = self.analyze_query(query)
+                reply_currency, currency_note = self.resolve_currency(keywords, currency)
+                response = self.with_currency_note(
+                    self.render_response(keywords, data_version, crypto_data, reply_currency), currency_note) \
+                    + stale_note
+                answered[query] = response
+            responses.append(response)
+        return responses
+
+    def render_response(self, keywords: set, data_version: int, crypto_data: Dict[str, dict],
+                        currency: str = BASE_CURRENCY) -> str:
+        """Build a reply, reusing the cached one until a coin, ranking or exchange rate it shows changes"""
+        cache_key = (frozenset(keywords), currency)
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            return cached.text
+        rule_engine, trend_window = self.rule_engine, self.trend_window
+        with self.stage_timers['format'].time():
+            response = self.build_response(keywords, crypto_data, currency)
+        coins, views = self.response_dependencies(keywords, crypto_data)
+        if currency != BASE_CURRENCY:
+            views |= {f'fx_{currency}'}
+        with self._data_lock:
+            # A reply rendered from an older snapshot or settings may already have been invalidated
+            if self.data_version == data_version and self.rule_engine is rule_engine \
+                    and self.trend_window == trend_window:
+                self.response_cache.put(cache_key, CachedResponse(response, coins, views))
+        return response
+
+    def select_branch(self, keywords: set, crypto_data: Dict[str, dict]) -> Tuple[str, Optional[str]]:
+        """Pick the reply for a keyword set: (branch, specific coin id or None)"""
         specific_crypto = None
         for keyword in keywords:
             if keyword.startswith('specific_'):
                 specific_crypto = keyword.replace('specific_', '')
                 break
+        if specific_crypto and specific_crypto in crypto_data:
+            return 'specific', specific_crypto
+        rule = self.rule_engine.first_match(keywords)
+        return (rule.name if rule else 'default'), None
+
+    def response_dependencies(self, keywords: set, crypto_data: Dict[str, dict]):
+        """Coins shown in, and ranked views read by, the reply for a keyword set"""
+        branch, specific_crypto = self.select_branch(keywords, crypto_data)
+        if branch == 'specific':
+            return frozenset([specific_crypto]), frozenset()
+        if branch in ('greeting', 'default'):
+            return frozenset(), frozenset()
+        if branch == 'trending':
+            movers = self.trending_movers(crypto_data)
+            if movers is not None:
+                return frozenset(crypto_id for crypto_id, _ in movers), frozenset(['momentum'])
+        shown = self.get_rule_results(crypto_data).matches(branch)
+        return frozenset(shown), frozenset([BRANCH_VIEWS.get(branch, 'rules')])
 
-        if specific_crypto and specific_crypto in self.crypto_data:
-            data = self.crypto_data[specific_crypto]
+    def staleness_note(self) -> str:
+        """Footer telling the user the data is past its refresh interval, if it is"""
+        if not self.is_data_stale():
+            return ""
+        saved_at = self.last_update.strftime('%Y-%m-%d %H:%M')
+        return f"\n\n⏳ Showing prices from {saved_at} while live data refreshes."
+
+    def build_response(self, keywords: set, crypto_data: Optional[Dict[str, dict]] = None,
+                       currency: str = BASE_CURRENCY) -> str:
+        """Render the reply for a set of analyzed keywords"""
+        if crypto_data is None:
+            crypto_data = self.crypto_data
+        store = self.get_market_store(crypto_data)
+        # Price strings come preformatted from the store, converted to the reply currency
+        money = self.get_currency_view(currency, crypto_data)
+        price_text, market_cap_text, row = money.price_text, money.market_cap_text, store.index
+        results = self.get_rule_results(crypto_data)
+        branch, specific_crypto = self.select_branch(keywords, crypto_data)
+
+        # Handle specific crypto queries
+        if branch == 'specific':
+            data = crypto_data[specific_crypto]
             name = data['name']
-            price = self.format_price(data['current_price'])
+            price = price_text[row[specific_crypto]]
             change = data.get('price_change_percentage_24h', 0)
             change_emoji = "📈" if change > 0 else "📉" if change < 0 else "➡️"
-            sustainability = self.sustainability_scores.get(specific_crypto, 5)
+            sustainability = store.score(specific_crypto)
             
             return (f"💰 {name} ({data['symbol'].upper()})\n"
                    f"Price: {price} {change_emoji} {change:+.2f}% (24h)\n"
-                   f"Market Cap: {self.format_market_cap(data['market_cap'])}\n"
+                   f"Market Cap: {market_cap_text[row[specific_crypto]]}\n"
                    f"🌱 Sustainability Score: {sustainability}/10")
 
         # Handle greeting
-        if 'greeting' in keywords:
+        if branch == 'greeting':
             return ("👋 Hello there! I'm here to help with crypto insights.\n"
                    "Ask me about trending coins, sustainable options, or specific prices!")
 
         # Handle sustainability queries
-        if 'sustainable' in keywords:
-            sustainable_cryptos = self.get_sustainable_cryptos()
+        if branch == 'sustainable':
+            sustainable_cryptos = results.matches('sustainable')
             if sustainable_cryptos:
                 response = "🌱 Most sustainable cryptocurrencies:\n"
-                for crypto_id, score in sustainable_cryptos[:3]:
-                    name = self.crypto_data[crypto_id]['name']
-                    price = self.format_price(self.crypto_data[crypto_id]['current_price'])
-                    response += f"• {name}: {score}/10 sustainability score (${price})\n"
+                for crypto_id in sustainable_cryptos:
+                    score = store.score(crypto_id)
+                    name = crypto_data[crypto_id]['name']
+                    price = price_text[row[crypto_id]]
+                    response += f"• {name}: {score}/10 sustainability score ({price})\n"
                 response += "\n💡 These use energy-efficient consensus mechanisms!"
                 return response
             else:
                 return "🌱 All tracked cryptos have sustainability considerations. Consider researching Proof-of-Stake coins!"
 
         # Handle trending queries
-        if 'trending' in keywords:
-            trending = self.get_trending_cryptos()
-            if trending:
-                response = "📈 Currently trending (24h gains):\n"
-                for crypto_id in trending[:5]:
-                    data = self.crypto_data[crypto_id]
+        if branch == 'trending':
+            movers = self.trending_movers(crypto_data)
+            if movers is None:
+                period = "24h gains"
+                movers = [(crypto_id, crypto_data[crypto_id].get('price_change_percentage_24h', 0))
+                          for crypto_id in results.matches('trending')]
+            else:
+                period = f"{self.trend_window} momentum"
+            if movers:
+                response = f"📈 Currently trending ({period}):\n"
+                for crypto_id, change in movers:
+                    data = crypto_data[crypto_id]
                     name = data['name']
-                    change = data.get('price_change_percentage_24h', 0)
-                    price = self.format_price(data['current_price'])
+                    price = price_text[row[crypto_id]]
                     response += f"• {name}: +{change:.2f}% ({price})\n"
                 return response
             else:
                 return "📉 No cryptos are showing strong upward trends right now. Market might be consolidating!"
 
         # Handle price queries
-        if 'price' in keywords:
+        if branch == 'price':
             response = "💰 Current crypto prices:\n"
-            sorted_cryptos = sorted(self.crypto_data.items(), 
-                                  key=lambda x: x[1]['market_cap_rank'])
-            for crypto_id, data in sorted_cryptos[:5]:
+            for crypto_id in results.matches('price'):
+                data = crypto_data[crypto_id]
                 name = data['name']
-                price = self.format_price(data['current_price'])
+                price = price_text[row[crypto_id]]
                 change = data.get('price_change_percentage_24h', 0)
                 change_emoji = "📈" if change > 0 else "📉" if change < 0 else "➡️"
                 response += f"• {name}: {price} {change_emoji} {change:+.2f}%\n"
             return response
 
         # Handle market cap queries
-        if 'market' in keywords:
+        if branch == 'market':
             response = "📊 Top cryptocurrencies by market cap:\n"
-            sorted_cryptos = sorted(self.crypto_data.items(), 
-                                  key=lambda x: x[1]['market_cap'], reverse=True)
-            for crypto_id, data in sorted_cryptos[:5]:
+            for crypto_id in results.matches('market'):
+                data = crypto_data[crypto_id]
                 name = data['name']
-                market_cap = self.format_market_cap(data['market_cap'])
+                market_cap = market_cap_text[row[crypto_id]]
                 rank = data['market_cap_rank']
                 response += f"#{rank} {name}: {market_cap}\n"
             return response
 
         # Handle profit/investment queries
-        if 'profit' in keywords:
-            trending = self.get_trending_cryptos()
-            sustainable = [crypto[0] for crypto in self.get_sustainable_cryptos()]
-            
-            # Find cryptos that are both trending and sustainable
-            best_options = [crypto for crypto in trending if crypto in sustainable]
+        if branch == 'profit':
+            # Cryptos that are both trending and sustainable, screened once per refresh
+            best_options = results.matches('profit')
             
             if best_options:
                 response = "💰 Potentially profitable & sustainable options:\n"
-                for crypto_id in best_options[:3]:
-                    data = self.crypto_data[crypto_id]
+                for crypto_id in best_options:
+                    data = crypto_data[crypto_id]
                     name = data['name']
                     change = data.get('price_change_percentage_24h', 0)
-                    sustainability = self.sustainability_scores.get(crypto_id, 5)
+                    sustainability = store.score(crypto_id)
                     response += f"• {name}: +{change:.2f}% today, {sustainability}/10 sustainability\n"
                 response += "\n⚠️ Remember: All crypto investments are risky!"
                 return response
@@ -363,6 +862,19 @@ class CryptoChatbot:
                        "• Always do your own research!\n"
                        "⚠️ Crypto is highly volatile and risky!")
 
+        # Any other screening rule: list what it selected
+        if branch != 'default':
+            matches = results.matches(branch)
+            if not matches:
+                return f"🔎 {self.rule_engine.by_name[branch].title}: no cryptos match right now."
+            response = f"🔎 {self.rule_engine.by_name[branch].title}:\n"
+            for crypto_id in matches:
+                data = crypto_data[crypto_id]
+                price = price_text[row[crypto_id]]
+                change = data.get('price_change_percentage_24h', 0)
+                response += f"• {data['name']}: {price} {change:+.2f}%\n"
+            return response
+
         # Default response
         return ("🤔 I can help you with:\n"
                "• 'What's trending?' - See rising cryptos\n"
@@ -371,9 +883,57 @@ class CryptoChatbot:
                "• 'Market leaders?' - Top cryptocurrencies\n"
                "• 'Investment advice?' - Profit potential analysis")
 
+    def answer_request(self, request: dict, start: float) -> dict:
+        """Answer a parsed NDJSON request, timing it from start (a perf_counter value)"""
+        response, keywords, data_version, currency = self.answer_query(request['query'], request.get('currency'))
+        result = {
+            'query': request['query'],
+            'response': response,
+            'intents': sorted(keywords),
+            'data_version': data_version,
+            'currency': currency,
+            'latency_ms': round((time.perf_counter() - start) * 1000, 3),
+        }
+        if 'id' in request:
+            result = {'id': request['id'], **result}
+        return result
+
+    def stream_ndjson(self, infile: TextIO, outfile: TextIO, flush_every: int = 512):
+        """Answer line-delimited JSON queries, writing one JSON result per line
+
+        Each input line is either a JSON string or an object with a "query"
+        field and an optional "id" that is echoed back. Results are written in
+        chunks of flush_every lines, so memory use does not grow with the input.
+        A line that fails gets an error result; later lines are still answered.
+        """
+        buffer = []
+        for line_number, line in enumerate(infile, 1):
+            line = line.strip()
+            if not line:
+                continue
+            start = time.perf_counter()
+            try:
+                request = parse_request(line)
+            except (ValueError, KeyError, TypeError) as e:
+                result = {'line': line_number, 'error': f"Invalid request: {e}"}
+            else:
+                try:
+                    result = self.answer_request(request, start)
+                except Exception as e:
+                    result = {'line': line_number, 'error': f"Internal error: {e}"}
+                    if 'id' in request:
+                        result = {'id': request['id'], **result}
+            buffer.append(json.dumps(result))
+            if len(buffer) >= flush_every:
+                outfile.write('\n'.join(buffer) + '\n')
+                buffer.clear()
+        if buffer:
+            outfile.write('\n'.join(buffer) + '\n')
+        outfile.flush()
+
     def chat(self):
         """Main chat loop"""
-        self.fetch_crypto_data()
+        self.warm_start()
         self.greet()
         
         print("\n" + "="*50)
@@ -406,10 +966,51 @@ class CryptoChatbot:
                 print(f"\nCryptopal: 😅 Sorry, I encountered an error: {e}")
                 print("Please try asking something else!")
 
+        self.stop_refresher()
+
 def main():
     """Run the chatbot"""
+    parser = argparse.ArgumentParser(description="Cryptopal - your friendly crypto advisor")
+    parser.add_argument('--ndjson', nargs='?', const='-', metavar='FILE',
+                        help="answer NDJSON queries from FILE (default: stdin) and write NDJSON results to stdout")
+    parser.add_argument('--metrics', metavar='FILE',
+                        help="write metrics to FILE on exit (JSON if it ends in .json, else Prometheus text)")
+    parser.add_argument('--profile', metavar='FILE', help="sample stacks while running and write them to FILE")
+    parser.add_argument('--currency', choices=sorted(CURRENCIES), default=BASE_CURRENCY,
+                        help="currency to show prices in unless a query names another")
+    args = parser.parse_args()
+
     chatbot = CryptoChatbot()
-    chatbot.chat()
+    chatbot.currency = args.currency
+    if args.profile:
+        chatbot.profiler.start()
+    try:
+        run(chatbot, args)
+    finally:
+        if args.profile:
+            chatbot.profiler.stop()
+            chatbot.profiler.write(args.profile)
+        if args.metrics:
+            chatbot.metrics.write(args.metrics)
+
+def run(chatbot: CryptoChatbot, args: argparse.Namespace):
+    """Run the interactive chat, or stream NDJSON if --ndjson was given"""
+    if args.ndjson is None:
+        chatbot.chat()
+        return
+
+    # Status messages go to stderr so stdout stays valid NDJSON
+    output = sys.stdout
+    with redirect_stdout(sys.stderr):
+        chatbot.warm_start()
+        try:
+            if args.ndjson == '-':
+                chatbot.stream_ndjson(sys.stdin, output)
+            else:
+                with open(args.ndjson, 'r', encoding='utf-8') as infile:
+                    chatbot.stream_ndjson(infile, output)
+        finally:
+            chatbot.stop_refresher()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
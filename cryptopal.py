@@ -1,6 +1,8 @@
 # 🧠 Cryptopal — A Rule-Based Crypto Investment Chatbot
 # Assignment: Analyzing profitability and sustainability of cryptocurrencies using rule-based AI
 
+from rule_engine import Rule, RuleEngine, columns_from_records
+
 print("👋 Hey there! I'm Cryptopal – your guide to smart and sustainable crypto picks! 🚀")
 print("Ask me things like:\n- Which crypto is trending up?\n- What’s the most sustainable coin?\n- Which crypto should I buy for long-term growth?\n(Type 'exit' to quit.)\n")
 
@@ -27,42 +29,63 @@ crypto_db = {
 }
 
 # === Step 3 & 4: Chatbot Logic + Advice Rules ===
+# Each rule is triggered by an intent and screens the coins declaratively
+advice_rules = RuleEngine([
+    Rule("sustainable", intents=["sustainable"], order_by="sustainability_score", limit=1),
+    Rule("trending", intents=["trending"], when=[("price_trend", "==", "rising")]),
+    Rule("growth", intents=["growth"], when=[
+        ("price_trend", "==", "rising"),
+        ("market_cap", "in", ("high", "medium")),
+        ("energy_use", "==", "low"),
+        ("sustainability_score", ">", 7),
+    ]),
+])
+advice = advice_rules.bind(columns_from_records(crypto_db), list(crypto_db))
+
+# Query phrases for each intent, checked in order
+query_intents = [
+    ("exit", ["exit"]),
+    ("sustainable", ["sustainable", "eco"]),
+    ("trending", ["trending", "rising"]),
+    ("growth", ["long-term", "growth", "should i buy"]),
+]
+
+def detect_intent(query):
+    for intent, phrases in query_intents:
+        if any(phrase in query for phrase in phrases):
+            return intent
+    return None
+
 def get_most_sustainable():
-    return max(crypto_db, key=lambda x: crypto_db[x]["sustainability_score"])
+    return advice.matches("sustainable")[0]
 
 def get_trending_cryptos():
-    return [coin for coin, data in crypto_db.items() if data["price_trend"] == "rising"]
+    return advice.matches("trending")
 
 def get_profitable_and_sustainable():
-    options = []
-    for coin, data in crypto_db.items():
-        if (data["price_trend"] == "rising" 
-            and data["market_cap"] in ["high", "medium"] 
-            and data["energy_use"] == "low"
-            and data["sustainability_score"] > 7):
-            options.append(coin)
-    return options
+    return advice.matches("growth")
 
 # === Step 5: User Interaction ===
 while True:
     user_query = input("You: ").lower()
+    intent = detect_intent(user_query)
 
-    if "exit" in user_query:
+    if intent == "exit":
         print("Cryptopal: Catch you later! 🚀 Remember—crypto is risky. Always do your own research! 📚")
         break
 
-    elif "sustainable" in user_query or "eco" in user_query:
+    elif intent == "sustainable":
         coin = get_most_sustainable()
         print(f"Cryptopal: Invest in {coin}! 🌱 It’s eco-friendly and has long-term potential!")
 
-    elif "trending" in user_query or "rising" in user_query:
+    elif intent == "trending":
         trending = get_trending_cryptos()
         if trending:
             print(f"Cryptopal: These cryptos are on the rise: {', '.join(trending)} 📈")
         else:
             print("Cryptopal: Hmm... nothing's rising right now. Markets can be moody! 📉")
 
-    elif "long-term" in user_query or "growth" in user_query or "should i buy" in user_query:
+    elif intent == "growth":
         good_picks = get_profitable_and_sustainable()
         if good_picks:
             print(f"Cryptopal: {good_picks[0]} is a smart pick for growth – trending up and super sustainable! 💰🌿")
@@ -0,0 +1,178 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+MAX_PER_PAGE = 250  # CoinGecko's own page size limit
+
+# Real coins first so specific-coin and sustainability queries have something to hit
+KNOWN_COINS = [
+    ('bitcoin', 'Bitcoin', 'btc', 67420),
+    ('ethereum', 'Ethereum', 'eth', 3890),
+    ('solana', 'Solana', 'sol', 189),
+    ('cardano', 'Cardano', 'ada', 0.62),
+    ('polygon', 'Polygon', 'matic', 0.72),
+    ('stellar', 'Stellar', 'xlm', 0.11),
+    ('tezos', 'Tezos', 'xtz', 0.95),
+    ('algorand', 'Algorand', 'algo', 0.34),
+]
+
+
+def synthetic_universe(size: int, seed: int = 0) -> List[dict]:
+    """Build a deterministic market universe shaped like a CoinGecko /coins/markets response"""
+    rng = random.Random(seed)
+    coins = []
+    for index in range(size):
+        if index < len(KNOWN_COINS):
+            crypto_id, name, symbol, price = KNOWN_COINS[index]
+        else:
+            crypto_id, name, symbol = f'synth-{index}', f'Synthcoin {index}', f's{index}'
+            price = round(10 ** rng.uniform(-4, 4), 6)
+        coins.append({
+            'id': crypto_id,
+            'name': name,
+            'symbol': symbol,
+            'current_price': price,
+            'market_cap': round(price * 10 ** rng.uniform(6, 9)),
+            'price_change_percentage_24h': round(rng.uniform(-10, 10), 3),
+        })
+    coins.sort(key=lambda coin: coin['market_cap'], reverse=True)
+    for rank, coin in enumerate(coins, 1):
+        coin['market_cap_rank'] = rank
+    return coins
+
+# (currency, unit, units per USD) served by /exchange_rates
+EXCHANGE_RATES = [
+    ('usd', '$', 1.0),
+    ('eur', '€', 0.92),
+    ('gbp', '£', 0.79),
+    ('jpy', '¥', 151.2),
+]
+
+
+class FakeCoinGecko:
+    """Threaded HTTP server answering /api/v3/coins/markets and /exchange_rates from an in-memory universe"""
+
+    def __init__(self, coins: List[dict], host: str = '127.0.0.1', port: int = 0,
+                 latency: float = 0.0):
+        self.coins = coins
+        self.latency = latency  # Seconds of artificial delay per request
+        self.request_count = 0
+        self._by_id: Dict[str, dict] = {coin['id']: coin for coin in coins}
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Base API URL to use as CryptoChatbot.api_url"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/v3"
+
+    def markets(self, query: Dict[str, List[str]]) -> List[dict]:
+        """Filter and paginate the universe the way CoinGecko does"""
+        ids = query.get('ids', [''])[0]
+        if ids:
+            coins = [self._by_id[crypto_id] for crypto_id in ids.split(',') if crypto_id in self._by_id]
+            coins.sort(key=lambda coin: coin['market_cap_rank'])
+        else:
+            coins = self.coins
+        per_page = min(int(query.get('per_page', ['100'])[0]), MAX_PER_PAGE)
+        page = max(int(query.get('page', ['1'])[0]), 1)
+        return coins[(page - 1) * per_page:page * per_page]
+
+    def exchange_rates(self) -> dict:
+        """A fixed /exchange_rates table, quoted against BTC like CoinGecko's"""
+        usd = self._by_id['bitcoin']['current_price'] if 'bitcoin' in self._by_id else 67420
+        rates = {'btc': ('Bitcoin', 'BTC', 1.0, 'crypto')}
+        for currency, unit, per_usd in EXCHANGE_RATES:
+            rates[currency] = (currency.upper(), unit, usd * per_usd, 'fiat')
+        return {'rates': {currency: {'name': name, 'unit': unit, 'value': value, 'type': kind}
+                          for currency, (name, unit, value, kind) in rates.items()}}
+
+    def respond(self, path: str, query: Dict[str, List[str]]) -> Tuple[int, object]:
+        """Status and JSON body for a GET of path (without a trailing slash)"""
+        if path == '/api/v3/exchange_rates':
+            return 200, self.exchange_rates()
+        if path != '/api/v3/coins/markets':
+            return 404, {'error': 'Not found'}
+        try:
+            return 200, self.markets(query)
+        except ValueError as e:
+            return 400, {'error': str(e)}
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, like the real API
+
+            def do_GET(self):
+                fake.request_count += 1
+                if fake.latency:
+                    time.sleep(fake.latency)
+                parsed = urlparse(self.path)
+                status, body = fake.respond(parsed.path.rstrip('/'), parse_qs(parsed.query))
+                try:
+                    self._send(status, body)
+                except ConnectionError:
+                    pass  # The client gave up waiting, e.g. a simulated timeout
+
+            def _send(self, status: int, body):
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def serve_forever(self):
+        """Serve on the calling thread until interrupted"""
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+    def start(self) -> 'FakeCoinGecko':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'FakeCoinGecko':
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a synthetic CoinGecko /coins/markets endpoint")
+    parser.add_argument('--coins', type=int, default=1000, help="size of the synthetic universe")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help="artificial delay per request in seconds")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server = FakeCoinGecko(synthetic_universe(args.coins, args.seed), port=args.port, latency=args.latency)
+    print(f"Serving {args.coins} coins at {server.url} (set COINGECKO_API_URL to use it)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
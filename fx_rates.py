@@ -0,0 +1,81 @@
+import time
+from typing import Dict, Optional, Set
+
+BASE_CURRENCY = 'usd'  # Market data is always fetched in this currency
+
+# Display symbol and decimals for amounts of 1 or more, per supported reply currency
+CURRENCIES = {
+    'usd': ('$', 2),
+    'eur': ('€', 2),
+    'gbp': ('£', 2),
+    'jpy': ('¥', 0),
+}
+
+DEFAULT_FX_INTERVAL = 3600  # Exchange rates move slowly; refresh them hourly
+FX_RETRY_INTERVAL = 300     # Wait after a failed rate fetch
+
+
+def format_price(price: float, currency: str = BASE_CURRENCY) -> str:
+    """Format price nicely"""
+    symbol, decimals = CURRENCIES[currency]
+    if price >= 1:
+        return f"{symbol}{price:,.{decimals}f}"
+    else:
+        return f"{symbol}{price:.4f}"
+
+
+def format_market_cap(market_cap: float, currency: str = BASE_CURRENCY) -> str:
+    """Format market cap in billions/millions"""
+    symbol = CURRENCIES[currency][0]
+    if market_cap >= 1_000_000_000:
+        return f"{symbol}{market_cap/1_000_000_000:.1f}B"
+    elif market_cap >= 1_000_000:
+        return f"{symbol}{market_cap/1_000_000:.1f}M"
+    else:
+        return f"{symbol}{market_cap:,.0f}"
+
+
+def parse_exchange_rates(payload: dict) -> Dict[str, float]:
+    """Units of each supported currency per USD, from a CoinGecko /exchange_rates response
+
+    CoinGecko quotes every rate against BTC, so each is divided by the USD rate.
+    """
+    rates = payload['rates']
+    usd = float(rates[BASE_CURRENCY]['value'])
+    if usd <= 0:
+        raise ValueError("Invalid USD exchange rate")
+    return {currency: float(rates[currency]['value']) / usd
+            for currency in CURRENCIES if currency in rates}
+
+
+class FxRates:
+    """Cached rates from USD, refreshed on their own slower schedule than market data"""
+
+    def __init__(self, interval: float = DEFAULT_FX_INTERVAL, retry_interval: float = FX_RETRY_INTERVAL):
+        self.interval = interval
+        self.retry_interval = retry_interval
+        self.rates: Dict[str, float] = {BASE_CURRENCY: 1.0}
+        self.fetched_at: Optional[float] = None  # time.monotonic() of the last successful fetch
+        self._next_attempt = 0.0
+
+    def due(self) -> bool:
+        """Whether the rates should be fetched again"""
+        return time.monotonic() >= self._next_attempt
+
+    def update(self, rates: Dict[str, float]) -> Set[str]:
+        """Swap in fetched rates, returning the currencies whose rate changed"""
+        now = time.monotonic()
+        self.fetched_at = now
+        self._next_attempt = now + self.interval
+        new = {**self.rates, **rates, BASE_CURRENCY: 1.0}
+        changed = {currency for currency, rate in new.items() if self.rates.get(currency) != rate}
+        self.rates = new
+        return changed
+
+    def failed(self):
+        """Keep the last good rates and try again after retry_interval"""
+        self._next_attempt = time.monotonic() + self.retry_interval
+
+    def rate(self, currency: str) -> Optional[float]:
+        """Units of currency per USD, or None if no rate has been fetched"""
+        return self.rates.get(currency)
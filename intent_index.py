@@ -0,0 +1,250 @@
+import re
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Keyword vocabulary for each intent, matched against lemmatized tokens
+INTENT_KEYWORDS = {
+    'greeting': ['hi', 'hello', 'hey', 'good', 'morning', 'afternoon', 'evening'],
+    'sustainable': ['sustainable', 'sustainability', 'green', 'eco', 'environment', 'carbon', 'energy'],
+    'trending': ['trend', 'trending', 'hot', 'popular', 'rising', 'up', 'gaining'],
+    'price': ['price', 'cost', 'value', 'worth', 'expensive', 'cheap'],
+    'profit': ['profit', 'profitable', 'investment', 'invest', 'growth', 'gain', 'return'],
+    'market': ['market', 'cap', 'capitalization', 'size', 'big', 'large', 'top'],
+    # Reply currency; prices are shown in the currency mentioned
+    'currency_usd': ['usd', 'dollar'],
+    'currency_eur': ['eur', 'euro', '€'],
+    'currency_gbp': ['gbp', 'pound', 'sterling', '£'],
+    'currency_jpy': ['jpy', 'yen', '¥'],
+}
+
+
+def coin_patterns(crypto_data: Dict[str, dict]) -> Tuple[Tuple[str, str, str], ...]:
+    """The (id, name, symbol) triples a coin matcher is built from"""
+    return tuple((crypto_id, data['name'], data['symbol']) for crypto_id, data in crypto_data.items())
+
+
+# Coin names are matched on whole alphanumeric tokens, so "usd-coin" reads as "usd coin"
+_WORD_RE = re.compile(r'[a-z0-9]+')
+
+# Shorter tokens are only matched exactly: "sol" must not become "sold" or "soul"
+FUZZY_MIN_LENGTH = 5
+# Longer tokens may be two edits away
+FUZZY_LONG_LENGTH = 9
+# Longest run of query tokens compared with a multi-word coin name
+FUZZY_MAX_TOKENS = 3
+# Trigrams shared by more names than this are too common to narrow the search, and don't count
+FUZZY_MAX_POSTING = 512
+# A fuzzy match must share at least this many of the rarer trigrams
+FUZZY_MIN_SHARED = 2
+# Most terms compared by edit distance per phrase, those sharing the most trigrams first
+FUZZY_MAX_CANDIDATES = 8
+
+# Query words never read as misspelled coin names
+COMMON_WORDS = frozenset(word for words in INTENT_KEYWORDS.values() for word in words) | {
+    'about', 'which', 'where', 'there', 'their', 'these', 'those', 'should', 'would', 'could',
+    'today', 'crypto', 'cryptos', 'cryptocurrency', 'cryptocurrencies', 'coins', 'token', 'tokens',
+    'prices', 'think', 'right', 'worth', 'buying', 'selling', 'leaders', 'advice',
+}
+
+
+def words(text: str) -> List[str]:
+    """Lowercase alphanumeric tokens of a query or coin name"""
+    return _WORD_RE.findall(text.lower())
+
+
+def trigrams(term: str) -> Set[str]:
+    """Character trigrams of a term padded with a space on each side"""
+    padded = f' {term} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Edit distance counting adjacent swaps as one edit, or limit + 1 once it exceeds limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    # A shared prefix or suffix costs nothing, and names in a family share long ones
+    start, stop_a, stop_b = 0, len(a), len(b)
+    while start < stop_a and start < stop_b and a[start] == b[start]:
+        start += 1
+    while stop_a > start and stop_b > start and a[stop_a - 1] == b[stop_b - 1]:
+        stop_a -= 1
+        stop_b -= 1
+    a, b = a[start:stop_a], b[start:stop_b]
+    # Only cells within limit of the diagonal can stay within limit; the rest read as limit + 1
+    over = limit + 1
+    previous2: List[int] = []
+    previous = [min(j, over) for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        low, high = max(1, i - limit), min(len(b), i + limit)
+        current = [over] * (len(b) + 1)
+        current[0] = min(i, over)
+        char, before = a[i - 1], a[i - 2] if i > 1 else ''
+        for j in range(low, high + 1):
+            # Comparisons rather than min(): this loop is most of a fuzzy lookup
+            value = previous[j - 1] if char == b[j - 1] else previous[j - 1] + 1
+            if previous[j] < value:
+                value = previous[j] + 1
+            if current[j - 1] < value:
+                value = current[j - 1] + 1
+            if j > 1 and char == b[j - 2] and before == b[j - 1] and previous2[j - 2] < value:
+                value = previous2[j - 2] + 1
+            current[j] = value if value < over else over
+        if min(current[low - 1:high + 1]) > limit:
+            return over
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class CoinMatcher:
+    """Coin lookup over ids, names and symbols, built once per coin list
+
+    Exact matches are phrase lookups on whole query tokens, longest phrase
+    first, so "sol" no longer matches inside "console". Tokens left over are
+    looked up in a trigram index of coin ids and names and accepted within
+    one edit (two for long words), so "etherium" still finds ethereum.
+    """
+
+    def __init__(self, crypto_data: Dict[str, dict]):
+        self.patterns = coin_patterns(crypto_data)
+        # Phrase -> coin ids; an id or name wins over another coin's symbol
+        names: Dict[str, List[str]] = {}
+        symbols: Dict[str, List[str]] = {}
+        for crypto_id, name, symbol in self.patterns:
+            for phrases, pattern in ((names, crypto_id), (names, name), (symbols, symbol)):
+                phrase = ' '.join(words(pattern))
+                coins = phrases.setdefault(phrase, [])
+                if crypto_id not in coins:
+                    coins.append(crypto_id)
+        symbols.pop('', None)
+        names.pop('', None)
+        self.phrases: Dict[str, Tuple[str, ...]] = {
+            phrase: tuple(coins) for phrase, coins in {**symbols, **names}.items()}
+        self.max_tokens = max((phrase.count(' ') + 1 for phrase in self.phrases), default=1)
+
+        # Trigram index over id and name phrases long enough to be fuzzy matched
+        self.terms: List[str] = [phrase for phrase in names if len(phrase) >= FUZZY_MIN_LENGTH]
+        self.term_coins: List[Tuple[str, ...]] = [self.phrases[term] for term in self.terms]
+        self.term_lengths = array('i', map(len, self.terms))
+        postings: Dict[str, List[int]] = {}
+        for term_id, term in enumerate(self.terms):
+            for gram in trigrams(term):
+                postings.setdefault(gram, []).append(term_id)
+        self.postings = {gram: array('i', ids) for gram, ids in postings.items()}
+
+    def find(self, text: str) -> List[str]:
+        """Return coin ids mentioned in text, in order of appearance"""
+        tokens = words(text)
+        hits: List[Tuple[int, Tuple[str, ...]]] = []  # (token position, coin ids)
+        unmatched: List[int] = []
+        phrases = self.phrases
+        i = 0
+        while i < len(tokens):
+            for size in range(min(self.max_tokens, len(tokens) - i), 0, -1):
+                coins = phrases.get(' '.join(tokens[i:i + size]))
+                if coins:
+                    hits.append((i, coins))
+                    i += size
+                    break
+            else:
+                unmatched.append(i)
+                i += 1
+
+        if unmatched and self.terms:
+            hits.extend(self._find_fuzzy(tokens, unmatched))
+            hits.sort(key=lambda hit: hit[0])
+
+        found: List[str] = []
+        seen: Set[str] = set()
+        for _, coins in hits:
+            for crypto_id in coins:
+                if crypto_id not in seen:
+                    seen.add(crypto_id)
+                    found.append(crypto_id)
+        return found
+
+    def _find_fuzzy(self, tokens: List[str], unmatched: List[int]) -> List[Tuple[int, Tuple[str, ...]]]:
+        """Closest coin for runs of unmatched tokens, longest run first"""
+        hits = []
+        free = set(unmatched)
+        for position in unmatched:
+            if position not in free:
+                continue
+            for size in range(FUZZY_MAX_TOKENS, 0, -1):
+                window = range(position, position + size)
+                if not all(index in free for index in window):
+                    continue
+                # Runs of short or everyday words ("what is the") aren't worth a lookup
+                if all(len(tokens[index]) < FUZZY_MIN_LENGTH or tokens[index] in COMMON_WORDS
+                       for index in window):
+                    continue
+                coins = self.closest(' '.join(tokens[position:position + size]))
+                if coins:
+                    hits.append((position, coins))
+                    free.difference_update(window)
+                    break
+        return hits
+
+    def closest(self, phrase: str) -> Optional[Tuple[str, ...]]:
+        """Coins whose id or name is nearest to phrase within the allowed edits, if only one is"""
+        if len(phrase) < FUZZY_MIN_LENGTH:
+            return None
+        limit = 2 if len(phrase) >= FUZZY_LONG_LENGTH else 1
+        grams = trigrams(phrase)
+        # An edit changes at most 4 trigrams (3, or 4 for a swap), so a match shares all but
+        # 4 * limit of them. Only rare trigrams are counted, so the common ones are taken off
+        # what is needed, but a match must always share a few rare ones.
+        needed = len(grams) - 4 * limit
+        shared: Counter = Counter()
+        for gram in grams:
+            ids = self.postings.get(gram)
+            if ids is None:
+                continue
+            if len(ids) > FUZZY_MAX_POSTING:
+                needed -= 1
+                continue
+            shared.update(ids)
+        needed = max(needed, FUZZY_MIN_SHARED)
+
+        lengths = self.term_lengths
+        shortest, longest = len(phrase) - limit, len(phrase) + limit
+        candidates = [term_id for term_id, count in shared.items()
+                      if count >= needed and shortest <= lengths[term_id] <= longest]
+        if len(candidates) > FUZZY_MAX_CANDIDATES:
+            size = len(phrase)
+            candidates.sort(key=lambda term_id: (-shared[term_id], abs(lengths[term_id] - size), term_id))
+            del candidates[FUZZY_MAX_CANDIDATES:]
+
+        best, best_distance, tied = None, limit + 1, False
+        terms, term_coins = self.terms, self.term_coins
+        for term_id in candidates:
+            distance = edit_distance(phrase, terms[term_id], min(limit, best_distance))
+            if distance < best_distance:
+                best, best_distance, tied = term_id, distance, False
+            elif distance == best_distance <= limit and term_coins[term_id] != term_coins[best]:
+                tied = True
+        # Several coins equally close ("synthcoin" for Synthcoin 1 to 9) is no match at all
+        if best is None or tied:
+            return None
+        return term_coins[best]
+
+
+class IntentIndex:
+    """Inverted token→intent map compiled once from the keyword vocabulary"""
+
+    def __init__(self, intent_keywords: Dict[str, Iterable[str]] = INTENT_KEYWORDS):
+        token_intents: Dict[str, Set[str]] = {}
+        for intent, words in intent_keywords.items():
+            for word in words:
+                token_intents.setdefault(word, set()).add(intent)
+        self.token_intents = {word: frozenset(intents) for word, intents in token_intents.items()}
+
+    def match(self, lemmas: Iterable[str]) -> Set[str]:
+        """Classify a sequence of lemmas in a single pass"""
+        keywords = set()
+        lookup = self.token_intents.get
+        for lemma in lemmas:
+            intents = lookup(lemma)
+            if intents:
+                keywords |= intents
+        return keywords
@@ -0,0 +1,197 @@
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import redirect_stdout
+from datetime import timedelta
+from typing import Dict, List, NamedTuple
+
+from benchmark import INTENT_QUERIES, percentile
+from cryptobot import CryptoChatbot
+from fake_coingecko import FakeCoinGecko, synthetic_universe
+from market_replay import ReplayServer, Scenario, load_recording
+
+
+class Sample(NamedTuple):
+    """Timing of one query"""
+    scheduled: float   # perf_counter time the query was due
+    started: float
+    finished: float
+    refreshing: bool   # A market refresh was running when the query started
+    source: str        # Data source the reply was served from
+    failed: bool
+
+
+def query_mix(chatbot: CryptoChatbot, specific: int = 20, seed: int = 0) -> List[str]:
+    """Every reply branch, plus price questions about the largest coins, shuffled"""
+    queries = list(INTENT_QUERIES.values())
+    for crypto_id in chatbot.get_market_store().by_rank[:specific]:
+        queries.append(f"what's the {chatbot.crypto_data[crypto_id]['name']} price?")
+    queries += ["bitcoin price in euros", "top coins by market cap in yen"]
+    random.Random(seed).shuffle(queries)
+    return queries
+
+
+def follow_scenarios(chatbot: CryptoChatbot, server: ReplayServer, stop: threading.Event, period: float = 0.05):
+    """Point the chatbot at https on the replay server while an ssl scenario is active"""
+    while not stop.wait(period):
+        url = server.ssl_url()
+        if chatbot.api_url != url:
+            chatbot.api_url = url
+            chatbot.get_fetcher().api_url = url
+
+
+def generate_load(chatbot: CryptoChatbot, queries: List[str], qps: float, duration: float,
+                  workers: int = 4) -> List[Sample]:
+    """Send queries on a fixed open-loop schedule of qps for duration seconds
+
+    Latency is measured from when each query was due, not when a worker got to
+    it, so a stall shows up in every query it delayed.
+    """
+    total = int(qps * duration)
+    start = time.perf_counter() + 0.1
+    samples: List[Sample] = []
+    position = [0]
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                index = position[0]
+                position[0] += 1
+            if index >= total:
+                return
+            scheduled = start + index / qps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            started = time.perf_counter()
+            refreshing = chatbot.refresh_in_progress()
+            source = chatbot.data_source or 'none'
+            failed = False
+            try:
+                chatbot.respond_to_query(queries[index % len(queries)])
+            except Exception:
+                failed = True
+            finished = time.perf_counter()
+            with lock:
+                samples.append(Sample(scheduled, started, finished, refreshing, source, failed))
+
+    threads = [threading.Thread(target=worker, name=f'load-{n}', daemon=True) for n in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples
+
+
+def latency_summary(samples: List[Sample]) -> Dict[str, object]:
+    """Count and latency percentiles (in ms, measured from the scheduled time) of some queries"""
+    if not samples:
+        return {'queries': 0}
+    latencies = sorted((sample.finished - sample.scheduled) * 1000 for sample in samples)
+    service = sorted((sample.finished - sample.started) * 1000 for sample in samples)
+    return {
+        'queries': len(samples),
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p90_ms': round(percentile(latencies, 0.90), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'max_ms': round(latencies[-1], 3),
+        'service_p50_ms': round(percentile(service, 0.50), 3),
+        'service_p99_ms': round(percentile(service, 0.99), 3),
+    }
+
+
+def report(samples: List[Sample], qps: float, chatbot: CryptoChatbot, server: FakeCoinGecko) -> dict:
+    elapsed = max(sample.finished for sample in samples) - min(sample.scheduled for sample in samples)
+    sources = sorted({sample.source for sample in samples})
+    return {
+        'target_qps': qps,
+        'achieved_qps': round(len(samples) / elapsed, 1) if elapsed > 0 else None,
+        'failed': sum(sample.failed for sample in samples),
+        'all': latency_summary(samples),
+        'during_refresh': latency_summary([sample for sample in samples if sample.refreshing]),
+        'between_refreshes': latency_summary([sample for sample in samples if not sample.refreshing]),
+        'by_source': {source: latency_summary([sample for sample in samples if sample.source == source])
+                      for source in sources},
+        'refreshes': {labels['result']: value for _, labels, value in chatbot.refresh_total.samples()},
+        'fallbacks': chatbot.fallback_total.value(),
+        'upstream_requests': server.request_count,
+        'upstream_outcomes': dict(getattr(server, 'served', {})),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Drive respond_to_query at a target QPS against replayed or synthetic market data")
+    parser.add_argument('--archive', help="market recording to replay (see market_replay.py record)")
+    parser.add_argument('--coins', type=int, default=1000, help="synthetic universe size when no archive is given")
+    parser.add_argument('--qps', type=float, default=200, help="queries per second to send")
+    parser.add_argument('--duration', type=float, default=30, help="seconds to send queries for")
+    parser.add_argument('--workers', type=int, default=4, help="threads sending queries")
+    parser.add_argument('--speed', type=float, default=60, help="recording seconds replayed per real second")
+    parser.add_argument('--refresh-interval', type=float, default=5,
+                        help="seconds between market refreshes during the run")
+    parser.add_argument('--fetch-timeout', type=float, default=2, help="seconds before an API request times out")
+    parser.add_argument('--scenario', action='append', default=[], type=Scenario.parse,
+                        metavar='KIND:START-END[:STATUS]',
+                        help="inject error, timeout or ssl failures (recording seconds); during ssl "
+                             "windows the chatbot is pointed at https on the plain replay server")
+    parser.add_argument('--no-latency', action='store_true', help="replay without the recorded API latency")
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    if args.archive:
+        _, exchanges = load_recording(args.archive)
+        server = ReplayServer(exchanges, speed=args.speed, scenarios=args.scenario,
+                              recorded_latency=not args.no_latency, stall=args.fetch_timeout + 1)
+        coin_ids = list(server.timeline.coins)
+    else:
+        universe = synthetic_universe(args.coins)
+        server = FakeCoinGecko(universe)
+        coin_ids = [coin['id'] for coin in universe]
+
+    chatbot = CryptoChatbot(snapshot_path=None, history_path=None)
+    chatbot.api_url = server.url
+    chatbot.coin_ids = coin_ids
+    chatbot.requests_per_second = None  # The local stand-in has no rate limit
+    chatbot.update_interval = timedelta(seconds=args.refresh_interval)
+    chatbot.get_fetcher().timeout = args.fetch_timeout
+
+    stop = threading.Event()
+    with server, open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        chatbot.fetch_crypto_data()
+        chatbot.preload()
+        if isinstance(server, ReplayServer):
+            threading.Thread(target=follow_scenarios, args=(chatbot, server, stop), daemon=True).start()
+        chatbot.start_refresher()
+        try:
+            samples = generate_load(chatbot, query_mix(chatbot), args.qps, args.duration, args.workers)
+        finally:
+            stop.set()
+            chatbot.stop_refresher()
+
+    result = report(samples, args.qps, chatbot, server)
+    overall = result['all']
+    print(f"{overall['queries']} queries at {result['achieved_qps']}/s (target {args.qps}/s): "
+          f"p50 {overall['p50_ms']}ms  p99 {overall['p99_ms']}ms  failed {result['failed']}", file=sys.stderr)
+    for name in ('during_refresh', 'between_refreshes'):
+        part = result[name]
+        if part['queries']:
+            print(f"  {name:<18} {part['queries']:>7} queries  p50 {part['p50_ms']}ms  p99 {part['p99_ms']}ms",
+                  file=sys.stderr)
+    print(f"  refreshes {result['refreshes']}  fallbacks {result['fallbacks']}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+    else:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
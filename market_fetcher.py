@@ -0,0 +1,159 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, List, Optional, Sequence
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import MetricsRegistry
+
+MAX_PER_PAGE = 250  # CoinGecko rejects larger pages
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until a request may be sent"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate          # Tokens added per second
+        self.capacity = capacity  # Largest burst allowed
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def describe_error(error: Exception) -> str:
+    """Exception type and HTTP status of a failed request, leaving out its URL and coin ids"""
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return f"{type(error).__name__} {status}" if status else type(error).__name__
+
+
+class FetchResult:
+    """Outcome of one paginated fetch"""
+
+    def __init__(self):
+        self.coins: List[dict] = []
+        self.pages_ok = 0
+        self.errors: List[Exception] = []
+        self.failed_pages: List[int] = []  # Page index of each error
+        self.insecure = False  # Pages were fetched without SSL verification
+
+    @property
+    def complete(self) -> bool:
+        return not self.errors
+
+
+class MarketFetcher:
+    """Fetch /coins/markets for many ids as concurrent pages over one keep-alive session"""
+
+    def __init__(self, session: requests.Session, api_url: str, vs_currency: str = 'usd',
+                 per_page: int = MAX_PER_PAGE, max_workers: int = 4,
+                 rate_limiter: Optional[TokenBucket] = None, max_retries: int = 2,
+                 timeout: float = 10, metrics: Optional[MetricsRegistry] = None):
+        self.session = session
+        self.api_url = api_url
+        self.vs_currency = vs_currency
+        self.per_page = min(per_page, MAX_PER_PAGE)
+        self.max_workers = max_workers
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries  # Extra attempts per page after the first
+        self.timeout = timeout
+        self._verify = True
+
+        metrics = metrics or MetricsRegistry(enabled=False)
+        self.pages_total = metrics.counter('cryptopal_fetch_pages_total', "Market pages fetched, by outcome",
+                                           ('result',))
+        self.retries_total = metrics.counter('cryptopal_fetch_retries_total', "Page requests retried, by HTTP status",
+                                             ('status',))
+        self.ssl_fallbacks_total = metrics.counter('cryptopal_fetch_ssl_fallback_total',
+                                                   "Fetches retried without SSL verification")
+
+        # Size the connection pool so concurrent pages reuse connections instead of queueing
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+    def fetch(self, coin_ids: Sequence[str],
+              on_page: Optional[Callable[[List[dict]], None]] = None) -> FetchResult:
+        """Fetch every id, calling on_page with each page's coins as soon as it arrives"""
+        self._verify = True
+        pages = [coin_ids[i:i + self.per_page] for i in range(0, len(coin_ids), self.per_page)]
+        result = FetchResult()
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(pages)) or 1) as executor:
+            futures = {executor.submit(self.fetch_page, page): index for index, page in enumerate(pages)}
+            for future in as_completed(futures):
+                try:
+                    coins = future.result()
+                except Exception as e:
+                    result.errors.append(e)
+                    result.failed_pages.append(futures[future])
+                    self.pages_total.inc(result='error')
+                    continue
+                result.pages_ok += 1
+                self.pages_total.inc(result='ok')
+                result.coins.extend(coins)
+                if on_page is not None:
+                    on_page(coins)
+        result.insecure = not self._verify
+        return result
+
+    def fetch_page(self, page_ids: Sequence[str]) -> List[dict]:
+        """Fetch one page of ids, retrying transient failures with exponential backoff"""
+        params = {
+            'vs_currency': self.vs_currency,
+            'ids': ','.join(page_ids),
+            'order': 'market_cap_desc',
+            'per_page': max(10, len(page_ids)),
+            'page': 1,
+            'sparkline': False,
+            'price_change_percentage': '24h'
+        }
+        attempt = 0
+        while True:
+            try:
+                return self._get(params)
+            except requests.exceptions.RequestException as e:
+                status = getattr(e.response, 'status_code', None)
+                retryable = status is None or status in RETRY_STATUSES
+                if attempt >= self.max_retries or not retryable:
+                    raise
+                delay = 0.5 * 2 ** attempt
+                retry_after = e.response.headers.get('Retry-After') if e.response is not None else None
+                if retry_after and retry_after.isdigit():
+                    delay = min(float(retry_after), 30)
+                self.retries_total.inc(status=status or 'network')
+                time.sleep(delay)
+                attempt += 1
+
+    def fetch_exchange_rates(self) -> dict:
+        """Fetch CoinGecko's exchange rate table (every currency against BTC) in one request"""
+        return self._get({}, 'exchange_rates')
+
+    def _get(self, params: dict, path: str = 'coins/markets'):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        url = f"{self.api_url}/{path}"
+        try:
+            response = self.session.get(url, params=params, timeout=self.timeout, verify=self._verify)
+        except requests.exceptions.SSLError:
+            if not self._verify:
+                raise
+            # If SSL fails, try without verification (development only); the caller reports it
+            self.ssl_fallbacks_total.inc()
+            self._verify = False
+            response = self.session.get(url, params=params, timeout=self.timeout, verify=False)
+        response.raise_for_status()
+        return response.json()
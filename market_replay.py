@@ -0,0 +1,323 @@
+import argparse
+import gzip
+import json
+import threading
+import time
+from bisect import bisect_right
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from fake_coingecko import MAX_PER_PAGE, FakeCoinGecko
+
+ARCHIVE_FORMAT = 1
+DEFAULT_ARCHIVE_PATH = 'market_recording.ndjson.gz'
+
+# How long a simulated timeout holds a request; longer than any sane client timeout
+DEFAULT_STALL = 30.0
+
+SCENARIO_KINDS = ('error', 'timeout', 'ssl')
+
+
+class Exchange(NamedTuple):
+    """One recorded API request and its response"""
+    t: float                 # Seconds since the recording started
+    path: str                # Relative to the API base URL, e.g. 'coins/markets'
+    params: Dict[str, str]
+    status: int
+    elapsed: float           # Seconds the API took to respond
+    body: str
+
+
+class TrafficRecorder:
+    """Append every API response a session receives to a gzip-compressed NDJSON archive
+
+    The first line is a header; each further line is one Exchange. Lines are
+    written as responses arrive, from whichever thread fetched them.
+    """
+
+    def __init__(self, path: str, api_url: str):
+        self.path = path
+        self.api_url = api_url.rstrip('/')
+        self._base_path = urlparse(self.api_url).path.rstrip('/')
+        self._file = gzip.open(path, 'wt', encoding='utf-8')
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._session: Optional[requests.Session] = None
+        self.exchanges = 0
+        self._write({'format': ARCHIVE_FORMAT, 'api_url': self.api_url,
+                     'recorded_at': datetime.now().isoformat(timespec='seconds')})
+
+    def _write(self, record: dict):
+        self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+    def attach(self, session: requests.Session):
+        """Start recording the responses of a session"""
+        self._session = session
+        session.hooks['response'].append(self.on_response)
+
+    def on_response(self, response: requests.Response, *args, **kwargs):
+        url = urlparse(response.request.url)
+        path = url.path[len(self._base_path):] if url.path.startswith(self._base_path) else url.path
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        record = {'t': round(time.monotonic() - self._start, 3), 'path': path.strip('/'), 'params': params,
+                  'status': response.status_code, 'elapsed': response.elapsed.total_seconds(),
+                  'body': response.text}
+        with self._lock:
+            self._write(record)
+            self.exchanges += 1
+
+    def close(self):
+        if self._session is not None:
+            self._session.hooks['response'].remove(self.on_response)
+            self._session = None
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self) -> 'TrafficRecorder':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def record(chatbot, path: str, duration: float, interval: float) -> int:
+    """Refresh a chatbot every interval seconds for duration seconds, recording its API traffic"""
+    with TrafficRecorder(path, chatbot.api_url) as recorder:
+        recorder.attach(chatbot.get_session())
+        deadline = time.monotonic() + duration
+        while True:
+            started = time.monotonic()
+            chatbot.fetch_crypto_data()
+            print(f"📼 {recorder.exchanges} responses recorded to {path}")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return recorder.exchanges
+            time.sleep(max(0.0, min(interval - (time.monotonic() - started), remaining)))
+
+
+def load_recording(path: str) -> Tuple[dict, List[Exchange]]:
+    """Read an archive's header and exchanges; a recording cut off mid-write keeps its complete lines"""
+    exchanges = []
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        if header.get('format') != ARCHIVE_FORMAT:
+            raise ValueError(f"{path} is not a format {ARCHIVE_FORMAT} market recording")
+        try:
+            for line in f:
+                entry = json.loads(line)
+                exchanges.append(Exchange(entry['t'], entry['path'], entry['params'], entry['status'],
+                                          entry['elapsed'], entry['body']))
+        except (EOFError, ValueError, KeyError):
+            pass
+    return header, exchanges
+
+
+class MarketTimeline:
+    """The market as it was at any point of a recording
+
+    Each coin keeps the times it was fetched and what was returned, so the
+    state at a given moment is one bisect per coin.
+    """
+
+    def __init__(self, exchanges: Iterable[Exchange]):
+        self.coins: Dict[str, Tuple[List[float], List[dict]]] = {}
+        self.rates: Tuple[List[float], List[dict]] = ([], [])
+        self.latency: Dict[str, Tuple[List[float], List[float]]] = {}  # path -> (times, recorded elapsed)
+        self.failures: List[Exchange] = []
+        self.duration = 0.0
+        for exchange in sorted(exchanges, key=lambda exchange: exchange.t):
+            self.duration = exchange.t
+            times, elapsed = self.latency.setdefault(exchange.path, ([], []))
+            times.append(exchange.t)
+            elapsed.append(exchange.elapsed)
+            if exchange.status != 200:
+                self.failures.append(exchange)
+                continue
+            try:
+                body = json.loads(exchange.body)
+            except ValueError:
+                continue
+            if exchange.path == 'coins/markets':
+                for coin in body:
+                    times, values = self.coins.setdefault(coin['id'], ([], []))
+                    times.append(exchange.t)
+                    values.append(coin)
+            elif exchange.path == 'exchange_rates':
+                self.rates[0].append(exchange.t)
+                self.rates[1].append(body)
+
+    @staticmethod
+    def _at(series: Tuple[List[float], list], t: float):
+        index = bisect_right(series[0], t) - 1
+        # Before its first fetch, a coin is served as first recorded
+        return series[1][max(index, 0)] if series[1] else None
+
+    def markets_at(self, t: float, ids: Optional[Iterable[str]] = None) -> List[dict]:
+        """Coins as last fetched by time t, in market cap order"""
+        wanted = self.coins if ids is None else [crypto_id for crypto_id in ids if crypto_id in self.coins]
+        coins = [self._at(self.coins[crypto_id], t) for crypto_id in wanted]
+        coins.sort(key=lambda coin: coin.get('market_cap_rank') or float('inf'))
+        return coins
+
+    def rates_at(self, t: float) -> Optional[dict]:
+        return self._at(self.rates, t)
+
+    def latency_at(self, path: str, t: float) -> float:
+        series = self.latency.get(path)
+        return self._at(series, t) if series else 0.0
+
+
+class Scenario(NamedTuple):
+    """A window of recording time during which the upstream API misbehaves"""
+    kind: str      # 'error' (HTTP status), 'timeout' (no reply in time) or 'ssl' (TLS failure)
+    start: float   # Recording seconds
+    end: float
+    status: int = 503
+
+    @classmethod
+    def parse(cls, spec: str) -> 'Scenario':
+        """Parse KIND:START-END[:STATUS], e.g. 'error:120-180:429' or 'timeout:300-360'"""
+        parts = spec.split(':')
+        if len(parts) not in (2, 3) or parts[0] not in SCENARIO_KINDS:
+            raise ValueError(f"Invalid scenario {spec!r}, expected KIND:START-END[:STATUS] "
+                             f"with KIND one of {', '.join(SCENARIO_KINDS)}")
+        start, _, end = parts[1].partition('-')
+        return cls(parts[0], float(start), float(end), int(parts[2]) if len(parts) == 3 else 503)
+
+
+class ReplayServer(FakeCoinGecko):
+    """Local CoinGecko stand-in that plays a recording back at a chosen speed
+
+    The recording clock runs at speed times real time and starts over at the
+    end, so prices keep moving for as long as the replay runs. Failures in
+    the recording replay as error scenarios. An 'ssl' scenario can't be
+    produced by a plain HTTP server; clients following ssl_url() are sent to
+    https on this port during it, which fails the TLS handshake for real.
+    """
+
+    def __init__(self, exchanges: Iterable[Exchange], speed: float = 1.0, scenarios: Iterable[Scenario] = (),
+                 recorded_latency: bool = True, stall: float = DEFAULT_STALL, loop: bool = True,
+                 host: str = '127.0.0.1', port: int = 0):
+        super().__init__([], host=host, port=port)
+        self.timeline = MarketTimeline(exchanges)
+        self.speed = speed
+        self.recorded_latency = recorded_latency
+        self.stall = stall
+        self.loop = loop
+        self.scenarios = list(scenarios) + [
+            Scenario('error', failure.t, failure.t + max(failure.elapsed, 1.0), failure.status)
+            for failure in self.timeline.failures]
+        self.served: Dict[str, int] = {}
+        self._started = time.monotonic()
+
+    def start(self) -> 'ReplayServer':
+        self._started = time.monotonic()
+        return super().start()
+
+    def clock(self) -> float:
+        """Current position in the recording, in recording seconds"""
+        t = (time.monotonic() - self._started) * self.speed
+        if self.loop and self.timeline.duration > 0:
+            t %= self.timeline.duration
+        return t
+
+    def scenario_at(self, t: float) -> Optional[Scenario]:
+        for scenario in self.scenarios:
+            if scenario.start <= t < scenario.end:
+                return scenario
+        return None
+
+    def ssl_url(self) -> str:
+        """The API URL a client should use now: https while an ssl scenario is active"""
+        scenario = self.scenario_at(self.clock())
+        if scenario is not None and scenario.kind == 'ssl':
+            return self.url.replace('http://', 'https://', 1)
+        return self.url
+
+    def respond(self, path: str, query: Dict[str, List[str]]) -> Tuple[int, object]:
+        t = self.clock()
+        scenario = self.scenario_at(t)
+        if scenario is not None and scenario.kind == 'error':
+            return self._count('error', scenario.status, {'error': f"Replayed {scenario.status} failure"})
+        if scenario is not None and scenario.kind == 'timeout':
+            time.sleep(self.stall)
+            return self._count('timeout', 504, {'error': "Replayed timeout"})
+
+        relative = path[len('/api/v3/'):] if path.startswith('/api/v3/') else path
+        if self.recorded_latency:
+            time.sleep(self.timeline.latency_at(relative, t))
+        if relative == 'exchange_rates':
+            rates = self.timeline.rates_at(t)
+            if rates is None:
+                return self._count('missing', 404, {'error': "No exchange rates in the recording"})
+            return self._count('ok', 200, rates)
+        if relative != 'coins/markets':
+            return self._count('missing', 404, {'error': 'Not found'})
+        try:
+            ids = query.get('ids', [''])[0]
+            coins = self.timeline.markets_at(t, ids.split(',') if ids else None)
+            per_page = min(int(query.get('per_page', ['100'])[0]), MAX_PER_PAGE)
+            page = max(int(query.get('page', ['1'])[0]), 1)
+        except ValueError as e:
+            return self._count('error', 400, {'error': str(e)})
+        return self._count('ok', 200, coins[(page - 1) * per_page:page * per_page])
+
+    def _count(self, outcome: str, status: int, body) -> Tuple[int, object]:
+        self.served[outcome] = self.served.get(outcome, 0) + 1
+        return status, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record CoinGecko traffic, or serve a recording back locally")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    recorder = commands.add_parser('record', help="refresh from the live API and record every response")
+    recorder.add_argument('--output', default=DEFAULT_ARCHIVE_PATH, help="archive to write (gzip NDJSON)")
+    recorder.add_argument('--duration', type=float, default=3600, help="seconds to record for")
+    recorder.add_argument('--interval', type=float, default=300, help="seconds between refreshes")
+    recorder.add_argument('--coins', help="comma-separated coin ids (default: the chatbot's list)")
+
+    server = commands.add_parser('serve', help="serve a recording as a local CoinGecko stand-in")
+    server.add_argument('archive')
+    server.add_argument('--port', type=int, default=8000)
+    server.add_argument('--speed', type=float, default=1.0, help="recording seconds per real second")
+    server.add_argument('--scenario', action='append', default=[], type=Scenario.parse,
+                        metavar='KIND:START-END[:STATUS]',
+                        help="inject error or timeout failures (recording seconds); ssl failures need a "
+                             "client that follows ReplayServer.ssl_url(), such as load_test.py, so serve "
+                             "rejects them")
+    server.add_argument('--no-latency', action='store_true', help="answer at once instead of as slow as recorded")
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        from cryptobot import CryptoChatbot
+        chatbot = CryptoChatbot(snapshot_path=None, history_path=None)
+        if args.coins:
+            chatbot.coin_ids = args.coins.split(',')
+        try:
+            count = record(chatbot, args.output, args.duration, args.interval)
+            print(f"✅ Recorded {count} responses")
+        except KeyboardInterrupt:
+            print("\n📼 Recording stopped")
+        return
+
+    if any(scenario.kind == 'ssl' for scenario in args.scenario):
+        server.error("ssl scenarios can't be served to ordinary clients over plain HTTP; "
+                     "use load_test.py --scenario ssl:... instead")
+
+    _, exchanges = load_recording(args.archive)
+    replay = ReplayServer(exchanges, speed=args.speed, scenarios=args.scenario,
+                          recorded_latency=not args.no_latency, port=args.port)
+    print(f"Replaying {len(exchanges)} responses ({replay.timeline.duration:.0f}s of recording, "
+          f"{len(replay.timeline.coins)} coins) at {replay.url} (set COINGECKO_API_URL to use it)")
+    try:
+        replay.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+from array import array
+from bisect import bisect_left, insort
+from typing import Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from fx_rates import format_market_cap, format_price
+
+SUSTAINABLE_THRESHOLD = 7  # Minimum score to count as highly sustainable
+DEFAULT_SUSTAINABILITY = 5
+
+# Fields compared between snapshots; name and symbol matter for coin matching
+DELTA_FIELDS = ('current_price', 'market_cap', 'price_change_percentage_24h', 'market_cap_rank',
+                'name', 'symbol')
+
+# Ranked views and how deep into each one replies look
+VIEW_NAMES = ('gainers', 'by_rank', 'by_market_cap', 'sustainable', 'trending_sustainable')
+VIEW_DEPTH = 5
+
+
+def _number(value, default: float = 0.0) -> float:
+    """Coerce an API number that may be missing or null"""
+    return default if value is None else float(value)
+
+
+class MarketDelta:
+    """Per-coin differences between two market snapshots"""
+
+    def __init__(self, added: Iterable[str] = (), removed: Iterable[str] = (),
+                 changed: Optional[Dict[str, Set[str]]] = None):
+        self.added: List[str] = list(added)
+        self.removed: Set[str] = set(removed)
+        self.changed: Dict[str, Set[str]] = changed or {}  # coin id -> changed fields
+        self.version: Optional[int] = None  # Data version the delta produced, set on publish
+
+    @property
+    def touched(self) -> Set[str]:
+        """Every coin id added, removed or changed"""
+        return set(self.added) | self.removed | set(self.changed)
+
+    @property
+    def renames_coins(self) -> bool:
+        """Whether the coin id/name/symbol list changed"""
+        return bool(self.added or self.removed or any(
+            'name' in fields or 'symbol' in fields for fields in self.changed.values()))
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+    def __repr__(self) -> str:
+        return (f"MarketDelta(version={self.version}, added={len(self.added)}, "
+                f"removed={len(self.removed)}, changed={len(self.changed)})")
+
+
+def compute_delta(old: Dict[str, dict], new: Dict[str, dict],
+                  ids: Optional[Iterable[str]] = None) -> MarketDelta:
+    """Diff two snapshots, optionally only looking at the given coin ids"""
+    added, changed = [], {}
+    for crypto_id in (new if ids is None else ids):
+        coin = new[crypto_id]
+        previous = old.get(crypto_id)
+        if previous is None:
+            added.append(crypto_id)
+        elif previous is not coin:
+            fields = {field for field in DELTA_FIELDS if previous.get(field) != coin.get(field)}
+            if fields:
+                changed[crypto_id] = fields
+    removed = [crypto_id for crypto_id in old if crypto_id not in new] if ids is None else []
+    return MarketDelta(added, removed, changed)
+
+
+class CurrencyView(NamedTuple):
+    """A store's prices converted at one exchange rate, with the display strings replies use"""
+    currency: str
+    rate: float
+    prices: array
+    price_text: List[str]
+    market_cap_text: List[str]
+
+    @classmethod
+    def build(cls, store: 'MarketStore', currency: str, rate: float) -> 'CurrencyView':
+        prices = array('d', (price * rate for price in store.prices))
+        return cls(currency, rate, prices,
+                   [format_price(price, currency) for price in prices],
+                   [format_market_cap(market_cap * rate, currency) for market_cap in store.market_caps])
+
+    def patched(self, store: 'MarketStore', price_rows: Iterable[int], cap_rows: Iterable[int]) -> 'CurrencyView':
+        """The view for a store that differs from this one's only in the given rows"""
+        prices, price_text, cap_text = array('d', self.prices), list(self.price_text), list(self.market_cap_text)
+        for row in price_rows:
+            price = store.prices[row] * self.rate
+            if row == len(prices):
+                prices.append(price)
+                price_text.append(format_price(price, self.currency))
+            else:
+                prices[row] = price
+                price_text[row] = format_price(price, self.currency)
+        for row in cap_rows:
+            text = format_market_cap(store.market_caps[row] * self.rate, self.currency)
+            if row == len(cap_text):
+                cap_text.append(text)
+            else:
+                cap_text[row] = text
+        return self._replace(prices=prices, price_text=price_text, market_cap_text=cap_text)
+
+
+class MarketStore:
+    """Column-oriented view of one market snapshot with rankings computed up front
+
+    Each ranking is kept as a sorted list of (key, row) pairs, so applying a
+    small delta only moves the affected rows instead of re-sorting everything.
+    Stores are never modified once built: apply() returns a new store.
+    """
+
+    def __init__(self, crypto_data: Dict[str, dict], sustainability_scores: Dict[str, float]):
+        self.coins = crypto_data
+        self.sustainability_scores = sustainability_scores
+        self.ids: List[str] = list(crypto_data)
+        self.index: Dict[str, int] = {crypto_id: row for row, crypto_id in enumerate(self.ids)}
+
+        rows = list(crypto_data.values())
+        self.prices = array('d', (_number(coin.get('current_price')) for coin in rows))
+        self.market_caps = array('d', (_number(coin.get('market_cap')) for coin in rows))
+        self.changes_24h = array('d', (_number(coin.get('price_change_percentage_24h')) for coin in rows))
+        self.ranks = array('d', (_number(coin.get('market_cap_rank'), float('inf')) for coin in rows))
+        self.sustainability = array('d', (sustainability_scores.get(crypto_id, DEFAULT_SUSTAINABILITY)
+                                          for crypto_id in self.ids))
+
+        # Descending orders use negated keys; the row breaks ties in snapshot order,
+        # matching a stable sort with reverse=True
+        everything = range(len(self.ids))
+        self._keys = {
+            'gainers': sorted((-self.changes_24h[row], row) for row in everything if self.changes_24h[row] > 0),
+            'by_rank': sorted((self.ranks[row], row) for row in everything),
+            'by_market_cap': sorted((-self.market_caps[row], row) for row in everything),
+            'sustainable': sorted((-self.sustainability[row], row) for row in everything
+                                  if self.sustainability[row] >= SUSTAINABLE_THRESHOLD),
+        }
+        self._materialize(VIEW_NAMES)
+
+    def _materialize(self, names: Iterable[str]):
+        """Turn sorted key lists into the public tuples of coin ids"""
+        ids = self.ids
+        names = set(names)
+        if 'gainers' in names:
+            self.gainers: Tuple[str, ...] = tuple(ids[row] for _, row in self._keys['gainers'])
+        if 'by_rank' in names:
+            self.by_rank: Tuple[str, ...] = tuple(ids[row] for _, row in self._keys['by_rank'])
+        if 'by_market_cap' in names:
+            self.by_market_cap: Tuple[str, ...] = tuple(ids[row] for _, row in self._keys['by_market_cap'])
+        if 'sustainable' in names:
+            self.sustainable: Tuple[Tuple[str, float], ...] = tuple(
+                (ids[row], self.score(ids[row])) for _, row in self._keys['sustainable'])
+        if names & {'gainers', 'sustainable', 'trending_sustainable'}:
+            green_ids = {crypto_id for crypto_id, _ in self.sustainable}
+            self.trending_sustainable: Tuple[str, ...] = tuple(
+                crypto_id for crypto_id in self.trending() if crypto_id in green_ids)
+
+    def apply(self, crypto_data: Dict[str, dict], delta: MarketDelta) -> 'MarketStore':
+        """Build the store for the next snapshot by patching only the rows in delta"""
+        if delta.removed:
+            # Removing rows renumbers everything after them; rebuild instead
+            return MarketStore(crypto_data, self.sustainability_scores)
+
+        store = MarketStore.__new__(MarketStore)
+        store.coins = crypto_data
+        store.sustainability_scores = self.sustainability_scores
+        store.gainers, store.by_rank, store.by_market_cap = self.gainers, self.by_rank, self.by_market_cap
+        store.sustainable, store.trending_sustainable = self.sustainable, self.trending_sustainable
+        currency_views = self.__dict__.get('_currency_views', {})
+        if not delta:
+            store.ids, store.index, store._keys = self.ids, self.index, self._keys
+            store.prices, store.market_caps, store.changes_24h = self.prices, self.market_caps, self.changes_24h
+            store.ranks, store.sustainability = self.ranks, self.sustainability
+            store._currency_views = dict(currency_views)
+            return store
+
+        store.ids = list(self.ids)
+        store.index = dict(self.index)
+        store.prices, store.market_caps = array('d', self.prices), array('d', self.market_caps)
+        store.changes_24h, store.ranks = array('d', self.changes_24h), array('d', self.ranks)
+        store.sustainability = array('d', self.sustainability)
+        store._keys = dict(self._keys)
+        dirty = set()
+
+        def keys_for(name: str) -> list:
+            # Copy a ranking the first time it is touched; untouched ones stay shared
+            if name not in dirty:
+                store._keys[name] = list(store._keys[name])
+                dirty.add(name)
+            return store._keys[name]
+
+        def move(name: str, row: int, old_key: Optional[float], new_key: Optional[float]):
+            if old_key == new_key:
+                return
+            keys = keys_for(name)
+            if old_key is not None:
+                del keys[bisect_left(keys, (old_key, row))]
+            if new_key is not None:
+                insort(keys, (new_key, row))
+
+        for crypto_id in delta.added:
+            coin = crypto_data[crypto_id]
+            row = len(store.ids)
+            store.ids.append(crypto_id)
+            store.index[crypto_id] = row
+            store.prices.append(_number(coin.get('current_price')))
+            store.market_caps.append(_number(coin.get('market_cap')))
+            store.changes_24h.append(_number(coin.get('price_change_percentage_24h')))
+            store.ranks.append(_number(coin.get('market_cap_rank'), float('inf')))
+            store.sustainability.append(self.sustainability_scores.get(crypto_id, DEFAULT_SUSTAINABILITY))
+            change, score = store.changes_24h[row], store.sustainability[row]
+            move('gainers', row, None, -change if change > 0 else None)
+            move('by_rank', row, None, store.ranks[row])
+            move('by_market_cap', row, None, -store.market_caps[row])
+            move('sustainable', row, None, -score if score >= SUSTAINABLE_THRESHOLD else None)
+
+        for crypto_id, fields in delta.changed.items():
+            coin = crypto_data[crypto_id]
+            row = store.index[crypto_id]
+            if 'current_price' in fields:
+                store.prices[row] = _number(coin.get('current_price'))
+            if 'price_change_percentage_24h' in fields:
+                old, new = store.changes_24h[row], _number(coin.get('price_change_percentage_24h'))
+                store.changes_24h[row] = new
+                move('gainers', row, -old if old > 0 else None, -new if new > 0 else None)
+            if 'market_cap_rank' in fields:
+                old, new = store.ranks[row], _number(coin.get('market_cap_rank'), float('inf'))
+                store.ranks[row] = new
+                move('by_rank', row, old, new)
+            if 'market_cap' in fields:
+                old, new = store.market_caps[row], _number(coin.get('market_cap'))
+                store.market_caps[row] = new
+                move('by_market_cap', row, -old, -new)
+
+        store._materialize(dirty)
+
+        # Converted prices are patched for the moved rows rather than converted again
+        if currency_views:
+            added = range(len(self.ids), len(store.ids))
+            price_rows = [*added, *(store.index[crypto_id] for crypto_id, fields in delta.changed.items()
+                                    if 'current_price' in fields)]
+            cap_rows = [*added, *(store.index[crypto_id] for crypto_id, fields in delta.changed.items()
+                                  if 'market_cap' in fields)]
+            store._currency_views = {currency: view.patched(store, price_rows, cap_rows)
+                                     for currency, view in currency_views.items()}
+        return store
+
+    @property
+    def columns(self) -> Dict[str, Sequence[float]]:
+        """Named numeric columns, as read by the rule engine"""
+        columns = self.__dict__.get('_columns')
+        if columns is None:
+            gain_rank = array('d', [float('inf')]) * len(self.ids)
+            for position, (_, row) in enumerate(self._keys['gainers']):
+                gain_rank[row] = position
+            columns = self._columns = {
+                'price': self.prices,
+                'market_cap': self.market_caps,
+                'change_24h': self.changes_24h,
+                'rank': self.ranks,
+                'sustainability': self.sustainability,
+                'gain_rank': gain_rank,  # Position among the 24h gainers, inf if not gaining
+            }
+        return columns
+
+    def ordering(self, column: str, descending: bool) -> Optional[Tuple[Iterator[int], Optional[tuple]]]:
+        """Rows presorted by a column, and the condition limiting which rows are included
+
+        Returns None when no sorted order is kept for the column and direction.
+        """
+        keys, covers = {
+            ('rank', False): ('by_rank', None),
+            ('market_cap', True): ('by_market_cap', None),
+            ('change_24h', True): ('gainers', ('change_24h', '>', 0)),
+            ('sustainability', True): ('sustainable', ('sustainability', '>=', SUSTAINABLE_THRESHOLD)),
+        }.get((column, descending), (None, None))
+        if keys is None:
+            return None
+        return (row for _, row in self._keys[keys]), covers
+
+    def currency_view(self, currency: str, rate: float) -> CurrencyView:
+        """Prices and market caps in another currency, converted and formatted once per rate"""
+        views = self.__dict__.setdefault('_currency_views', {})
+        view = views.get(currency)
+        if view is None or view.rate != rate:
+            view = views[currency] = CurrencyView.build(self, currency, rate)
+        return view
+
+    def trending(self, limit: int = 5) -> List[str]:
+        """Top gainers over the last 24h"""
+        return list(self.gainers[:limit])
+
+    def score(self, crypto_id: str):
+        """Sustainability score for a coin, keeping integer scores as ints"""
+        value = self.sustainability[self.index[crypto_id]]
+        return int(value) if value.is_integer() else value
+
+    def view(self, name: str) -> tuple:
+        """A ranked view by name"""
+        return getattr(self, name)
+
+
+def changed_views(old: MarketStore, new: MarketStore, depth: int = VIEW_DEPTH) -> FrozenSet[str]:
+    """Names of the ranked views whose top entries differ between two stores"""
+    return frozenset(name for name in VIEW_NAMES if old.view(name)[:depth] != new.view(name)[:depth])
@@ -0,0 +1,340 @@
+import json
+import math
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as Tally
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from 10us (cached replies) to 10s (slow API refreshes)
+DEFAULT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# (name, labels, value) rows reported by a collector at dump time
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+class Metric:
+    """A named metric family whose values are keyed by label values"""
+    kind = 'untyped'
+
+    def __init__(self, registry: 'MetricsRegistry', name: str, help: str, labelnames: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Unlabelled counters report 0 before their first increment
+        self._values: Dict[Tuple[str, ...], float] = {} if self.labelnames else {(): 0}
+
+    def inc(self, amount: float = 1, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in items]
+
+
+class Timer:
+    """Context manager that observes its elapsed time into a histogram"""
+    __slots__ = ('target', 'start')
+
+    def __init__(self, target: 'BoundHistogram'):
+        self.target = target
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.target._observe(time.perf_counter() - self.start)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+class Histogram(Metric):
+    """Distribution of observed values in fixed buckets, plus their sum and count"""
+    kind = 'histogram'
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple[str, ...], list] = {}  # key -> [bucket counts..., sum, count]
+
+    def _state(self, key: Tuple[str, ...]) -> list:
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        return state
+
+    def observe(self, value: float, **labels):
+        self.labels(**labels).observe(value)
+
+    def time(self, **labels):
+        """Time a with-block; a no-op while the registry is disabled"""
+        return self.labels(**labels).time()
+
+    def labels(self, **labels) -> 'BoundHistogram':
+        """The histogram for one label set, with the label lookup done up front"""
+        return BoundHistogram(self, self._key(labels))
+
+    def summary(self, **labels) -> Dict[str, float]:
+        """Count, sum and mean of the observations for one label set"""
+        state = self._values.get(self._key(labels))
+        if not state:
+            return {'count': 0, 'sum': 0.0, 'mean': None}
+        return {'count': state[-1], 'sum': state[-2], 'mean': state[-2] / state[-1]}
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        rows = []
+        for key, state in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), state):
+                cumulative += count
+                rows.append((f'{self.name}_bucket', {**labels, 'le': _format_value(bound)}, cumulative))
+            rows.append((f'{self.name}_sum', labels, state[-2]))
+            rows.append((f'{self.name}_count', labels, state[-1]))
+        return rows
+
+
+class BoundHistogram:
+    """One label set of a histogram, for timing hot paths"""
+    __slots__ = ('registry', 'buckets', 'state', 'lock')
+
+    def __init__(self, histogram: Histogram, key: Tuple[str, ...]):
+        self.registry = histogram.registry
+        self.buckets = histogram.buckets
+        self.state = histogram._state(key)
+        self.lock = histogram._lock
+
+    def observe(self, value: float):
+        if self.registry.enabled:
+            self._observe(value)
+
+    def _observe(self, value: float):
+        state = self.state
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def time(self):
+        """Time a with-block; a no-op while the registry is disabled"""
+        if not self.registry.enabled:
+            return NULL_TIMER
+        return Timer(self)
+
+
+class MetricsRegistry:
+    """In-process metrics that can be dumped as Prometheus text or JSON"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Tuple[str, str, str, Callable[[], Iterable[Sample]]]] = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, help: str, labelnames: Sequence[str], **kwargs) -> Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(self, name, help, labelnames, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, labelnames, buckets=buckets)
+
+    def register_collector(self, name: str, kind: str, help: str, collect: Callable[[], Iterable[Sample]]):
+        """Add a metric whose samples are read from elsewhere (e.g. cache stats) at dump time"""
+        self._collectors.append((name, kind, help, collect))
+
+    def families(self) -> List[Tuple[str, str, str, List[Sample]]]:
+        """Every metric as (name, kind, help, samples)"""
+        families = [(metric.name, metric.kind, metric.help, metric.samples())
+                    for metric in list(self._metrics.values())]
+        for name, kind, help, collect in self._collectors:
+            families.append((name, kind, help, list(collect())))
+        return families
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format"""
+        lines = []
+        for name, kind, help, samples in self.families():
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            for sample_name, labels, value in samples:
+                lines.append(f'{sample_name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def to_dict(self) -> Dict[str, dict]:
+        """Metrics as plain data, with histograms summarized per label set"""
+        result = {}
+        for name, kind, help, samples in self.families():
+            if kind == 'histogram':
+                series: Dict[Tuple, dict] = {}
+                for sample_name, labels, value in samples:
+                    bound = labels.get('le')
+                    plain = {key: value for key, value in labels.items() if key != 'le'}
+                    entry = series.setdefault(tuple(sorted(plain.items())),
+                                              {'labels': plain, 'buckets': {}})
+                    if bound is not None:
+                        entry['buckets'][bound] = value
+                    else:
+                        entry[sample_name[len(name) + 1:]] = value
+                values = list(series.values())
+            else:
+                values = [{'labels': labels, 'value': value} for _, labels, value in samples]
+            result[name] = {'type': kind, 'help': help, 'values': values}
+        return result
+
+    def to_json(self, indent: Optional[int] = None) -> str:
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def write(self, path: str):
+        """Write a dump, as JSON if the path ends in .json and Prometheus text otherwise"""
+        text = self.to_json(indent=2) if path.endswith('.json') else self.to_prometheus()
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+
+class SamplingProfiler:
+    """Statistical profiler that samples thread stacks from a background thread
+
+    The profiled code isn't instrumented, but every interval the sampler takes
+    the GIL to walk the stack of each thread, pausing the others for that long.
+    The cost grows with the thread count and stack depth; raise interval to cut
+    it, or start it only while investigating (it can be toggled at runtime).
+    Results are folded stacks, the input format of flamegraph tools.
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks: Tally = Tally()
+        self.samples = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='cryptopal-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def toggle(self) -> bool:
+        """Start or stop sampling, returning whether it is now running"""
+        if self.running:
+            self.stop()
+        else:
+            self.start()
+        return self.running
+
+    def reset(self):
+        with self._lock:
+            self.stacks.clear()
+            self.samples = 0
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, frame in frames.items():
+                    if thread_id == own_id:
+                        continue
+                    stack = []
+                    while frame is not None and len(stack) < self.max_depth:
+                        code = frame.f_code
+                        stack.append(f'{code.co_filename.rsplit("/", 1)[-1]}:{code.co_name}')
+                        frame = frame.f_back
+                    self.stacks[';'.join(reversed(stack))] += 1
+                self.samples += 1
+
+    def folded(self) -> str:
+        """Sampled stacks as 'outer;inner count' lines"""
+        with self._lock:
+            return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+    def top(self, limit: int = 20) -> List[Tuple[str, int]]:
+        """Functions most often on top of a sampled stack"""
+        leaves: Tally = Tally()
+        with self._lock:
+            for stack, count in self.stacks.items():
+                leaves[stack.rsplit(';', 1)[-1]] += count
+        return leaves.most_common(limit)
+
+    def write(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.folded())
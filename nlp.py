@@ -0,0 +1,113 @@
+import os
+import re
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+
+from intent_index import INTENT_KEYWORDS
+
+# 'auto' uses NLTK when its data is installed and the built-in normalizer otherwise,
+# 'nltk' always uses NLTK (downloading data if needed), 'builtin' never imports NLTK
+DEFAULT_BACKEND = os.environ.get('CRYPTOPAL_NLP', 'auto')
+
+# Words, hyphenated words, clitics like 's, and single punctuation marks
+_TOKEN_RE = re.compile(r"\w+(?:-\w+)*|'\w+|[^\w\s]")
+
+
+def simple_tokenize(text: str) -> List[str]:
+    """Regex tokenizer that splits the way word_tokenize does for chat-sized queries"""
+    return _TOKEN_RE.findall(text)
+
+
+def build_lemma_table(vocabulary: Iterable[str]) -> Dict[str, str]:
+    """Map the plural forms of each vocabulary word back to the word"""
+    table = {}
+    for word in vocabulary:
+        table[word + 's'] = word
+        if word.endswith(('s', 'x', 'z', 'ch', 'sh')):
+            table[word + 'es'] = word
+        if word.endswith('y') and word[-2:-1] not in 'aeiou':
+            table[word[:-1] + 'ies'] = word
+    # Never rewrite a vocabulary word into a different one
+    for word in vocabulary:
+        table.pop(word, None)
+    return table
+
+
+LEMMA_TABLE = build_lemma_table(
+    {word for words in INTENT_KEYWORDS.values() for word in words})
+
+
+class QueryNormalizer:
+    """Tokenizes and lemmatizes queries, loading the NLP backend on first use"""
+
+    def __init__(self, backend: str = DEFAULT_BACKEND):
+        if backend not in ('auto', 'nltk', 'builtin'):
+            raise ValueError(f"Unknown NLP backend: {backend}")
+        self.backend = backend
+        self.active_backend: Optional[str] = None
+        self._tokenize: Optional[Callable[[str], List[str]]] = None
+        self._lemmatize: Optional[Callable[[str], str]] = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Load the backend now, e.g. from a worker pre-fork hook"""
+        if self.active_backend is not None:
+            return
+        with self._lock:
+            if self.active_backend is not None:
+                return
+            if self.backend != 'builtin' and self._load_nltk(download=self.backend == 'nltk'):
+                return
+            self._tokenize = simple_tokenize
+            self._lemmatize = lambda token: LEMMA_TABLE.get(token, token)
+            self.active_backend = 'builtin'
+
+    def _load_nltk(self, download: bool) -> bool:
+        """Wire up NLTK's tokenizer and WordNet lemmatizer if they can be loaded"""
+        try:
+            import nltk
+            from nltk.stem import WordNetLemmatizer
+            from nltk.tokenize import word_tokenize
+        except ImportError:
+            if download:
+                raise
+            return False
+
+        if download:
+            for resource, package in (('tokenizers/punkt', 'punkt'),
+                                      ('tokenizers/punkt_tab', 'punkt_tab'),
+                                      ('corpora/wordnet', 'wordnet')):
+                try:
+                    nltk.data.find(resource)
+                except LookupError:
+                    nltk.download(package)
+
+        lemmatizer = WordNetLemmatizer()
+        try:
+            # Touch both so WordNet and punkt load here rather than on the first query
+            word_tokenize('warm up')
+            lemmatizer.lemmatize('prices')
+        except LookupError:
+            if download:
+                raise
+            return False
+
+        self._tokenize = word_tokenize
+        self._lemmatize = lemmatizer.lemmatize
+        self.active_backend = 'nltk'
+        return True
+
+    def tokenize(self, text: str) -> List[str]:
+        self.load()
+        return self._tokenize(text)
+
+    def lemmatize(self, tokens: List[str]) -> List[str]:
+        self.load()
+        lemmatize = self._lemmatize
+        return [lemmatize(token) for token in tokens]
+
+    def lemmas(self, text: str) -> List[str]:
+        """Tokenize and lemmatize text in one call"""
+        self.load()
+        lemmatize = self._lemmatize
+        return [lemmatize(token) for token in self._tokenize(text)]
@@ -0,0 +1,460 @@
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from array import array
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Container, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are still single writes, but compaction isn't guarded
+    fcntl = None
+
+DEFAULT_HISTORY_PATH = os.environ.get(
+    'CRYPTOPAL_HISTORY',
+    os.path.join(os.path.expanduser('~'), '.cache', 'cryptopal', 'price_history.bin'),
+)
+
+# Every sample is kept for a little over a day of refreshes every 5 minutes, which covers
+# the 1h-24h windows, volatility and moving averages. Longer windows read a coarse ring of
+# one sample per hour, which holds a week.
+DEFAULT_CAPACITY = 320
+COARSE_INTERVAL = 3600
+COARSE_CAPACITY = 7 * 24 + 8
+
+MOMENTUM_WINDOWS = {'1h': 3600, '6h': 6 * 3600, '24h': 24 * 3600, '7d': 7 * 24 * 3600}
+VOLATILITY_WINDOW = 24 * 3600
+SHORT_MA_WINDOW = 3600
+LONG_MA_WINDOW = 6 * 3600
+
+# File layout: a magic header, then one frame per refresh. A frame is the
+# timestamp and entry count, then (id length, id, price) per coin. Each frame
+# is written with a single append so a crash can only truncate the last one.
+MAGIC = b'CPH1'
+FRAME_HEADER = struct.Struct('<dI')
+ENTRY_PRICE = struct.Struct('<d')
+
+
+class RollingSum:
+    """Running sum and sum of squares of a series over a trailing time window"""
+
+    def __init__(self, span: float):
+        self.span = span
+        self.start = None  # Absolute index of the oldest sample in the window
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def push(self, series: 'CoinSeries', values: array, index: int):
+        """Add sample index and evict samples that fell out of the window"""
+        value = values[index % series.capacity]
+        if self.start is None:
+            self.start = index
+        self.count += 1
+        self.total += value
+        self.total_sq += value * value
+        cutoff = series.times[index % series.capacity] - self.span
+        while self.start < index and series.times[self.start % series.capacity] < cutoff:
+            self._evict(values[self.start % series.capacity])
+
+    def drop_before(self, series: 'CoinSeries', values: array, index: int):
+        """Evict samples older than index, before the ring overwrites them"""
+        while self.start is not None and self.start < index and self.count:
+            self._evict(values[self.start % series.capacity])
+
+    def _evict(self, value: float):
+        self.count -= 1
+        self.total -= value
+        self.total_sq -= value * value
+        self.start += 1
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    @property
+    def stdev(self) -> Optional[float]:
+        if self.count < 2:
+            return None
+        variance = (self.total_sq - self.total * self.total / self.count) / (self.count - 1)
+        return math.sqrt(max(variance, 0.0))
+
+
+def _advance(times: array, capacity: int, count: int, index: Optional[int], cutoff: float) -> Optional[int]:
+    """Move a window's reference in a ring to the newest sample at or before cutoff"""
+    oldest = max(0, count - capacity)
+    index = oldest if index is None else max(index, oldest)
+    last = count - 1
+    while index < last and times[(index + 1) % capacity] <= cutoff:
+        index += 1
+    return index if times[index % capacity] <= cutoff else None
+
+
+class CoinSeries:
+    """Bounded ring of (time, price) samples for one coin with incrementally updated analytics
+
+    Every sample goes into the main ring; the first one per coarse_interval also
+    goes into a small coarse ring, so windows longer than the main ring reaches
+    back still have a reference price without keeping every sample that long.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, windows: Optional[Dict[str, float]] = None,
+                 coarse_capacity: int = COARSE_CAPACITY, coarse_interval: float = COARSE_INTERVAL):
+        self.capacity = capacity
+        self.windows = MOMENTUM_WINDOWS if windows is None else windows
+        # Rings grow up to capacity, then wrap; absolute index i lives at i % capacity
+        self.times = array('d')
+        self.prices = array('d')
+        self.returns = array('d')  # Log return from the previous sample
+        self.count = 0  # Samples ever appended
+        self.coarse_capacity = coarse_capacity
+        self.coarse_interval = coarse_interval
+        self.coarse_times = array('d')
+        self.coarse_prices = array('d')
+        self.coarse_count = 0
+        self._lookback: Dict[str, Optional[int]] = dict.fromkeys(self.windows)
+        self._coarse_lookback: Dict[str, Optional[int]] = dict.fromkeys(self.windows)
+        self._volatility = RollingSum(VOLATILITY_WINDOW)
+        self._short_ma = RollingSum(SHORT_MA_WINDOW)
+        self._long_ma = RollingSum(LONG_MA_WINDOW)
+        self._ma_state = 0
+        self.last_cross: Optional[Tuple[str, float]] = None  # ('golden' | 'death', timestamp)
+
+    @property
+    def oldest(self) -> int:
+        """Absolute index of the oldest sample still in the ring"""
+        return max(0, self.count - self.capacity)
+
+    @property
+    def coarse_oldest(self) -> int:
+        return max(0, self.coarse_count - self.coarse_capacity)
+
+    @property
+    def last_time(self) -> Optional[float]:
+        return self.times[(self.count - 1) % self.capacity] if self.count else None
+
+    def append(self, timestamp: float, price: float) -> bool:
+        """Add a sample, ignoring ones that aren't newer than the last or have no usable price"""
+        if price is None or price <= 0 or (self.count and timestamp <= self.last_time):
+            return False
+        index = self.count
+        slot = index % self.capacity
+        log_return = math.log(price / self.prices[(index - 1) % self.capacity]) if index else 0.0
+        if len(self.times) < self.capacity:
+            self.times.append(timestamp)
+            self.prices.append(price)
+            self.returns.append(log_return)
+        else:
+            # The slot being reused holds the oldest sample; drop it from the windows first
+            self._volatility.drop_before(self, self.returns, index - self.capacity + 1)
+            self._short_ma.drop_before(self, self.prices, index - self.capacity + 1)
+            self._long_ma.drop_before(self, self.prices, index - self.capacity + 1)
+            self.times[slot] = timestamp
+            self.prices[slot] = price
+            self.returns[slot] = log_return
+        self.count += 1
+        if not self.coarse_count or \
+                timestamp - self.coarse_times[(self.coarse_count - 1) % self.coarse_capacity] >= self.coarse_interval:
+            self._append_coarse(timestamp, price)
+
+        for name, span in self.windows.items():
+            cutoff = timestamp - span
+            self._lookback[name] = _advance(self.times, self.capacity, self.count, self._lookback[name], cutoff)
+            self._coarse_lookback[name] = _advance(self.coarse_times, self.coarse_capacity, self.coarse_count,
+                                                   self._coarse_lookback[name], cutoff)
+        if index:
+            self._volatility.push(self, self.returns, index)
+        self._short_ma.push(self, self.prices, index)
+        self._long_ma.push(self, self.prices, index)
+
+        state = (self._short_ma.mean > self._long_ma.mean) - (self._short_ma.mean < self._long_ma.mean)
+        if state and self._ma_state and state != self._ma_state:
+            self.last_cross = ('golden' if state > 0 else 'death', timestamp)
+        if state:
+            self._ma_state = state
+        return True
+
+    def _append_coarse(self, timestamp: float, price: float):
+        if len(self.coarse_times) < self.coarse_capacity:
+            self.coarse_times.append(timestamp)
+            self.coarse_prices.append(price)
+        else:
+            slot = self.coarse_count % self.coarse_capacity
+            self.coarse_times[slot] = timestamp
+            self.coarse_prices[slot] = price
+        self.coarse_count += 1
+
+    def _reference(self, window: str) -> Optional[Tuple[float, float]]:
+        """(time, price) of the sample a window's change is measured from"""
+        index = self._lookback.get(window)
+        if index is not None and index >= self.oldest:
+            return self.times[index % self.capacity], self.prices[index % self.capacity]
+        index = self._coarse_lookback.get(window)
+        if index is not None and index >= self.coarse_oldest:
+            return self.coarse_times[index % self.coarse_capacity], self.coarse_prices[index % self.coarse_capacity]
+        return None
+
+    def momentum(self, window: str) -> Optional[float]:
+        """Percent price change over a window, or None if history doesn't cover it"""
+        reference = self._reference(window)
+        if reference is None:
+            return None
+        reference_time, reference_price = reference
+        # After a long gap the reference sample says nothing about this window
+        if self.last_time - reference_time > 2 * self.windows[window]:
+            return None
+        latest = self.prices[(self.count - 1) % self.capacity]
+        return (latest / reference_price - 1) * 100
+
+    def volatility(self) -> Optional[float]:
+        """Standard deviation of per-refresh returns over the last 24h, in percent"""
+        stdev = self._volatility.stdev
+        return None if stdev is None else stdev * 100
+
+    def moving_averages(self) -> Tuple[Optional[float], Optional[float]]:
+        """Short (1h) and long (6h) simple moving averages of the price"""
+        return self._short_ma.mean, self._long_ma.mean
+
+    @property
+    def trend(self) -> Optional[str]:
+        """'bullish' while the short average is above the long one, 'bearish' while below"""
+        return 'bullish' if self._ma_state > 0 else 'bearish' if self._ma_state < 0 else None
+
+    def samples(self) -> Iterable[Tuple[float, float]]:
+        """Retained (time, price) samples, oldest first: coarse ones older than the main ring, then the main ring"""
+        first = self.times[self.oldest % self.capacity] if self.count else None
+        for index in range(self.coarse_oldest, self.coarse_count):
+            timestamp = self.coarse_times[index % self.coarse_capacity]
+            if timestamp >= first:
+                break
+            yield timestamp, self.coarse_prices[index % self.coarse_capacity]
+        for index in range(self.oldest, self.count):
+            yield self.times[index % self.capacity], self.prices[index % self.capacity]
+
+
+class PriceHistory:
+    """Per-coin price history fed by every refresh, persisted as an append-only log
+
+    Processes sharing a log (e.g. several CLIs, or a pool parent) take a lock
+    file next to it while loading, appending and compacting.
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_HISTORY_PATH, capacity: int = DEFAULT_CAPACITY,
+                 windows: Optional[Dict[str, float]] = None, coarse_capacity: int = COARSE_CAPACITY):
+        self.path = path
+        self.capacity = capacity
+        self.coarse_capacity = coarse_capacity
+        self.windows = MOMENTUM_WINDOWS if windows is None else windows
+        self.series: Dict[str, CoinSeries] = {}
+        self.version = 0  # Bumped on every recorded frame
+        self._frames_on_disk = 0
+        # Compacting keeps at most one frame per retained sample, so the log stays within twice that
+        self._compact_after = 2 * (capacity + coarse_capacity)
+        self._movers: Dict[str, Optional[List[Tuple[str, float]]]] = {}  # window -> ranking
+        self._lock = threading.Lock()  # Guards the rings; held only in memory
+        self._write_lock = threading.Lock()  # Keeps this process's log writes in order
+        if path:
+            self._load()
+
+    def _series_for(self, crypto_id: str) -> CoinSeries:
+        series = self.series.get(crypto_id)
+        if series is None:
+            series = self.series[crypto_id] = CoinSeries(self.capacity, self.windows, self.coarse_capacity)
+        return series
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Hold the log's lock file against other processes"""
+        if fcntl is None:
+            yield
+            return
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)  # Also releases the lock
+
+    def _load(self):
+        """Replay the log into the rings, dropping a truncated final frame"""
+        try:
+            with self._file_lock():
+                self._load_locked()
+        except OSError:
+            return
+
+    def _load_locked(self):
+        try:
+            with open(self.path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size < len(MAGIC):
+                    return
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    if data[:len(MAGIC)] != MAGIC:
+                        print(f"⚠️ Ignoring unreadable price history at {self.path}")
+                        return
+                    good = self._replay(data, size)
+        except OSError:
+            return
+        if good < size:
+            try:
+                os.truncate(self.path, good)
+            except OSError:
+                pass
+
+    def _replay(self, data: mmap.mmap, size: int) -> int:
+        """Apply every complete frame, returning the offset just after the last one"""
+        offset = good = len(MAGIC)
+        while offset + FRAME_HEADER.size <= size:
+            timestamp, count = FRAME_HEADER.unpack_from(data, offset)
+            offset += FRAME_HEADER.size
+            entries = []
+            for _ in range(count):
+                if offset >= size:
+                    return good
+                length = data[offset]
+                end = offset + 1 + length + ENTRY_PRICE.size
+                if end > size:
+                    return good
+                crypto_id = data[offset + 1:offset + 1 + length].decode('utf-8', 'replace')
+                entries.append((crypto_id, ENTRY_PRICE.unpack_from(data, offset + 1 + length)[0]))
+                offset = end
+            for crypto_id, price in entries:
+                self._series_for(crypto_id).append(timestamp, price)
+            self._frames_on_disk += 1
+            good = offset
+        self.version += 1
+        return good
+
+    def record(self, crypto_data: Dict[str, dict], fetched_at: datetime) -> int:
+        """Append one refresh to every coin's ring and to the log; returns how many coins were added"""
+        timestamp = fetched_at.timestamp()
+        frame = []
+        retained = None
+        with self._lock:
+            for crypto_id, coin in crypto_data.items():
+                price = coin.get('current_price')
+                if price is not None and self._series_for(crypto_id).append(timestamp, float(price)):
+                    frame.append((crypto_id, float(price)))
+            if not frame:
+                return 0
+            self.version += 1
+            self._movers.clear()
+            if self.path and self._frames_on_disk >= self._compact_after:
+                retained = self._retained_frames()
+        # Disk I/O happens outside the ring lock, so queries never wait on it
+        if self.path:
+            with self._write_lock:
+                self._write_frame(timestamp, frame, retained)
+        return len(frame)
+
+    def _write_frame(self, timestamp: float, frame: List[Tuple[str, float]],
+                     retained: Optional[Dict[float, List[Tuple[str, float]]]] = None):
+        """Append a frame to the log, or rewrite the log from retained (which already holds the frame)"""
+        parts = [FRAME_HEADER.pack(timestamp, len(frame))]
+        for crypto_id, price in frame:
+            encoded = crypto_id.encode('utf-8')[:255]
+            parts.append(bytes([len(encoded)]) + encoded + ENTRY_PRICE.pack(price))
+        try:
+            with self._file_lock():
+                if retained is not None:
+                    self._compact(retained)
+                    return
+                directory = os.path.dirname(self.path) or '.'
+                os.makedirs(directory, exist_ok=True)
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    if os.fstat(fd).st_size == 0:
+                        os.write(fd, MAGIC)
+                    os.write(fd, b''.join(parts))
+                finally:
+                    os.close(fd)
+            self._frames_on_disk += 1
+        except OSError as e:
+            # History is a nice-to-have; keep collecting in memory
+            print(f"⚠️ Could not save price history: {e}")
+
+    def _retained_frames(self) -> Dict[float, List[Tuple[str, float]]]:
+        """The samples still held in memory, grouped into one frame per timestamp"""
+        frames: Dict[float, List[Tuple[str, float]]] = {}
+        for crypto_id, series in self.series.items():
+            for timestamp, price in series.samples():
+                frames.setdefault(timestamp, []).append((crypto_id, price))
+        return frames
+
+    def _compact(self, frames: Dict[float, List[Tuple[str, float]]]):
+        """Rewrite the log with only the given frames"""
+        directory = os.path.dirname(self.path) or '.'
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.history-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(MAGIC)
+                for timestamp in sorted(frames):
+                    entries = frames[timestamp]
+                    f.write(FRAME_HEADER.pack(timestamp, len(entries)))
+                    for crypto_id, price in entries:
+                        encoded = crypto_id.encode('utf-8')[:255]
+                        f.write(bytes([len(encoded)]) + encoded + ENTRY_PRICE.pack(price))
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        self._frames_on_disk = len(frames)
+
+    def momentum(self, crypto_id: str, window: str) -> Optional[float]:
+        series = self.series.get(crypto_id)
+        return series.momentum(window) if series else None
+
+    def top_movers(self, window: str, limit: int = 5,
+                   among: Optional[Container[str]] = None) -> Optional[List[Tuple[str, float]]]:
+        """Coins with positive momentum over a window, best first, or None if no coin's history covers it
+
+        The ranking is computed once per recorded frame, so queries never walk the history.
+        """
+        with self._lock:
+            if window in self._movers:
+                ranked = self._movers[window]
+            else:
+                scored, covered = [], False
+                for position, (crypto_id, series) in enumerate(self.series.items()):
+                    change = series.momentum(window)
+                    if change is not None:
+                        covered = True
+                        if change > 0:
+                            scored.append((-change, position, crypto_id))
+                ranked = [(crypto_id, -negated) for negated, _, crypto_id in sorted(scored)] if covered else None
+                self._movers[window] = ranked
+        if ranked is None:
+            return None
+        movers = []
+        for crypto_id, change in ranked:
+            if len(movers) >= limit:
+                break
+            if among is None or crypto_id in among:
+                movers.append((crypto_id, change))
+        return movers
+
+    def summary(self, crypto_id: str) -> Optional[Dict[str, object]]:
+        """Momentum per window, volatility and moving-average trend for one coin"""
+        series = self.series.get(crypto_id)
+        if series is None:
+            return None
+        short_ma, long_ma = series.moving_averages()
+        return {
+            'samples': series.count - series.oldest,
+            'momentum': {window: series.momentum(window) for window in self.windows},
+            'volatility': series.volatility(),
+            'short_ma': short_ma,
+            'long_ma': long_ma,
+            'trend': series.trend,
+            'last_cross': series.last_cross,
+        }
@@ -0,0 +1,71 @@
+import random
+import threading
+from typing import Callable, Optional
+
+
+class DataRefresher:
+    """Daemon thread that calls a refresh function on a jittered schedule with failure backoff"""
+
+    def __init__(self, refresh: Callable[[], bool], interval: float,
+                 jitter: float = 0.1, min_backoff: float = 5.0, max_backoff: Optional[float] = None):
+        self.refresh = refresh
+        self.interval = interval          # Seconds between successful refreshes
+        self.jitter = jitter              # Fraction of the interval to refresh early by, at most
+        self.min_backoff = min_backoff    # First retry delay after a failure
+        self.max_backoff = max_backoff if max_backoff is not None else interval
+        self.failures = 0
+        self.refreshing = False
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._next_delay = 0.0
+
+    def start(self, initial_delay: float = 0.0):
+        """Start the refresh thread; the first refresh runs after initial_delay seconds"""
+        if self.is_running():
+            return
+        self._stopped.clear()
+        self._next_delay = max(0.0, initial_delay)
+        self._thread = threading.Thread(target=self._run, name='crypto-refresher', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop the refresh thread, waiting up to timeout seconds for it to exit"""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def trigger(self):
+        """Ask for a refresh as soon as possible"""
+        self._wake.set()
+
+    def is_running(self) -> bool:
+        """Check if the refresh thread is alive"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def next_delay(self, succeeded: bool) -> float:
+        """Seconds to wait before the next refresh attempt"""
+        if succeeded:
+            self.failures = 0
+            # Refresh slightly early so readers rarely see data past its interval
+            return self.interval * (1 - self.jitter * random.random())
+        self.failures += 1
+        backoff = min(self.max_backoff, self.min_backoff * 2 ** (self.failures - 1))
+        return backoff * random.uniform(0.5, 1.0)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self._next_delay)
+            self._wake.clear()
+            if self._stopped.is_set():
+                break
+            self.refreshing = True
+            try:
+                succeeded = bool(self.refresh())
+            except Exception:
+                succeeded = False
+            finally:
+                self.refreshing = False
+            self._next_delay = self.next_delay(succeeded)
@@ -0,0 +1,204 @@
+import heapq
+import operator
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+OPERATORS: Dict[str, Callable[[object, object], bool]] = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+    'in': lambda value, options: value in options,
+    'not in': lambda value, options: value not in options,
+}
+
+
+class Condition(NamedTuple):
+    """A test on one column, e.g. Condition('sustainability', '>=', 7)"""
+    column: str
+    op: str
+    value: object
+
+
+class Rule:
+    """A declarative screening rule: which intents trigger it and which rows it selects
+
+    when is a list of conditions that must all hold; matches are sorted by
+    order_by (ties keep row order) and cut to limit. A rule with no
+    conditions selects every row; one with no order_by keeps row order.
+    """
+
+    def __init__(self, name: str, intents: Iterable[str] = (), when: Iterable[Sequence] = (),
+                 order_by: Optional[str] = None, descending: bool = True, limit: Optional[int] = None,
+                 title: Optional[str] = None):
+        self.name = name
+        self.title = title or name  # Heading when the rule's matches are listed in a reply
+        self.intents = frozenset(intents)
+        self.when = tuple(Condition(*condition) for condition in when)
+        for condition in self.when:
+            if condition.op not in OPERATORS:
+                raise ValueError(f"Rule {name}: unknown operator {condition.op!r}")
+        self.order_by = order_by
+        self.descending = descending
+        self.limit = limit
+
+    def __repr__(self) -> str:
+        return f"Rule({self.name!r})"
+
+
+class RuleEngine:
+    """Rules compiled once: conditions shared between rules are deduplicated and
+    rules are indexed by the intents that trigger them"""
+
+    def __init__(self, rules: Iterable[Rule]):
+        self.rules: Tuple[Rule, ...] = tuple(rules)
+        self.by_name: Dict[str, Rule] = {}
+        self.conditions: List[Condition] = []
+        self.rule_conditions: Dict[str, Tuple[int, ...]] = {}
+        self.position: Dict[str, int] = {}
+        self.by_intent: Dict[str, Tuple[Rule, ...]] = {}
+
+        condition_ids: Dict[Condition, int] = {}
+        by_intent: Dict[str, List[Rule]] = {}
+        for position, rule in enumerate(self.rules):
+            if rule.name in self.by_name:
+                raise ValueError(f"Duplicate rule name {rule.name!r}")
+            self.by_name[rule.name] = rule
+            self.position[rule.name] = position
+            ids = []
+            for condition in rule.when:
+                if condition not in condition_ids:
+                    condition_ids[condition] = len(self.conditions)
+                    self.conditions.append(condition)
+                ids.append(condition_ids[condition])
+            self.rule_conditions[rule.name] = tuple(ids)
+            for intent in rule.intents:
+                by_intent.setdefault(intent, []).append(rule)
+        self.by_intent = {intent: tuple(rules) for intent, rules in by_intent.items()}
+
+    def triggered(self, intents: Iterable[str]) -> List[Rule]:
+        """Rules any of the intents can fire, in declaration order"""
+        fired: Set[str] = set()
+        rules = []
+        for intent in intents:
+            for rule in self.by_intent.get(intent, ()):
+                if rule.name not in fired:
+                    fired.add(rule.name)
+                    rules.append(rule)
+        return sorted(rules, key=lambda rule: self.position[rule.name])
+
+    def first_match(self, intents: Iterable[str]) -> Optional[Rule]:
+        """The highest-priority (first declared) rule the intents trigger"""
+        best = None
+        for intent in intents:
+            for rule in self.by_intent.get(intent, ()):
+                if best is None or self.position[rule.name] < self.position[best.name]:
+                    best = rule
+                break  # Rules per intent are in declaration order
+        return best
+
+    def bind(self, columns: Dict[str, Sequence], ids: Sequence[str],
+             orderings: Optional[Callable[[str, bool], Optional[Tuple[Iterable[int], Optional[tuple]]]]] = None
+             ) -> 'RuleResults':
+        """Evaluate the rules lazily against one snapshot's columns"""
+        return RuleResults(self, columns, ids, orderings)
+
+
+class RuleResults:
+    """Rule matches for one snapshot, computed on first use and then reused
+
+    Each condition becomes a bitmask over the rows (bit i set when row i
+    passes), built in one pass over its column; a rule's mask is the AND of
+    its conditions' masks, so hundreds of rules sharing a few conditions cost
+    little more than the conditions themselves.
+    """
+
+    def __init__(self, engine: RuleEngine, columns: Dict[str, Sequence], ids: Sequence[str],
+                 orderings: Optional[Callable[[str, bool], Optional[Tuple[Iterable[int], Optional[tuple]]]]] = None):
+        self.engine = engine
+        self.columns = columns
+        self.ids = ids
+        self.size = len(ids)
+        self.orderings = orderings
+        self._all = (1 << self.size) - 1
+        self._condition_masks: Dict[int, int] = {}
+        self._matches: Dict[str, List[str]] = {}
+
+    def condition_mask(self, index: int) -> int:
+        mask = self._condition_masks.get(index)
+        if mask is None:
+            column, op, value = self.engine.conditions[index]
+            test = OPERATORS[op]
+            # Row 0 is the lowest bit, so the bit string is built from the last row backwards
+            values = self.columns[column]
+            bits = ''.join('1' if test(values[row], value) else '0' for row in range(self.size - 1, -1, -1))
+            mask = self._condition_masks[index] = int(bits or '0', 2)
+        return mask
+
+    def mask(self, name: str) -> int:
+        """Bitmask of the rows a rule selects"""
+        mask = self._all
+        for index in self.engine.rule_conditions[name]:
+            mask &= self.condition_mask(index)
+            if not mask:
+                break
+        return mask
+
+    def matches(self, name: str) -> List[str]:
+        """Ids a rule selects, ordered and limited as the rule says"""
+        result = self._matches.get(name)
+        if result is None:
+            rows = self._select(self.engine.by_name[name])
+            result = self._matches[name] = [self.ids[row] for row in rows]
+        return result
+
+    def count(self, name: str) -> int:
+        """How many rows pass a rule's conditions, before its limit"""
+        return bin(self.mask(name)).count('1')
+
+    def _select(self, rule: Rule) -> List[int]:
+        mask = self.mask(rule.name)
+        if not mask:
+            return []
+        bits = format(mask, f'0{self.size}b')[::-1]  # bits[row] == '1' when row matches
+        limit = rule.limit if rule.limit is not None else self.size
+
+        if rule.order_by is not None and self.orderings is not None:
+            # A presorted ordering of the column can be walked instead of sorting, as long as
+            # every row the rule can match is in it
+            ordering = self.orderings(rule.order_by, rule.descending)
+            if ordering is not None:
+                rows, covers = ordering
+                if covers is None or Condition(*covers) in rule.when:
+                    selected = []
+                    for row in rows:
+                        if bits[row] == '1':
+                            selected.append(row)
+                            if len(selected) >= limit:
+                                break
+                    return selected
+
+        rows = []
+        row = bits.find('1')
+        while row != -1:
+            rows.append(row)
+            row = bits.find('1', row + 1)
+        if rule.order_by is None:
+            return rows[:limit]
+        values = self.columns[rule.order_by]
+        if rule.descending:
+            return heapq.nsmallest(limit, rows, key=lambda row: (-values[row], row))
+        return heapq.nsmallest(limit, rows, key=lambda row: (values[row], row))
+
+    def screen(self, intents: Iterable[str]) -> Dict[str, List[str]]:
+        """Matches of every rule the intents trigger; no other rule is evaluated"""
+        return {rule.name: self.matches(rule.name) for rule in self.engine.triggered(intents)}
+
+
+def columns_from_records(records: Dict[str, dict]) -> Dict[str, list]:
+    """Turn {id: {field: value}} records into one list per field"""
+    fields: Dict[str, None] = {}
+    for record in records.values():
+        fields.update(dict.fromkeys(record))
+    return {field: [record.get(field) for record in records.values()] for field in fields}
@@ -0,0 +1,108 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional
+
+from cryptobot import CryptoChatbot
+from nlp import DEFAULT_BACKEND
+from snapshot_cache import save_snapshot
+
+# Per-process state for pool workers, set up by _init_worker
+_worker_bot = None
+_worker_snapshot_mtime = None
+
+
+def _init_worker(snapshot_path: str, nlp_backend: str):
+    """Create this worker's chatbot on top of the shared snapshot file"""
+    global _worker_bot
+    _worker_bot = CryptoChatbot(snapshot_path=snapshot_path, nlp_backend=nlp_backend)
+    _worker_bot.auto_refresh = False
+    _reload_if_changed()
+    _worker_bot.preload()
+
+
+def _reload_if_changed():
+    """Pick up a newer shared snapshot published by the parent process"""
+    global _worker_snapshot_mtime
+    try:
+        mtime = os.stat(_worker_bot.snapshot_path).st_mtime_ns
+    except OSError:
+        mtime = None
+    if mtime == _worker_snapshot_mtime:
+        return
+    _worker_snapshot_mtime = mtime
+    if not _worker_bot.load_snapshot():
+        _worker_bot.use_fallback_data()
+
+
+def _respond_batch(queries: List[str]) -> List[str]:
+    _reload_if_changed()
+    return _worker_bot.respond_to_queries(queries)
+
+
+def batched(queries: Iterable[str], batch_size: int) -> Iterator[List[str]]:
+    """Split an iterable of queries into lists of at most batch_size"""
+    iterator = iter(queries)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+class QueryPool:
+    """Process pool that answers query batches from one market snapshot shared by every worker"""
+
+    def __init__(self, processes: Optional[int] = None, chatbot: Optional[CryptoChatbot] = None,
+                 nlp_backend: str = DEFAULT_BACKEND):
+        # Only the parent talks to CoinGecko; workers read the snapshot it publishes
+        self.chatbot = chatbot or CryptoChatbot(nlp_backend=nlp_backend)
+        if not self.chatbot.crypto_data and not self.chatbot.load_snapshot():
+            self.chatbot.fetch_crypto_data()
+
+        self._directory = tempfile.mkdtemp(prefix='cryptopal-pool-')
+        self.snapshot_path = os.path.join(self._directory, 'shared_snapshot.json')
+        self._published_version = None
+        self.publish_snapshot()
+        self.pool = multiprocessing.Pool(processes, initializer=_init_worker,
+                                         initargs=(self.snapshot_path, nlp_backend))
+
+    def publish_snapshot(self):
+        """Write the parent's current data where the workers will pick it up"""
+        version = self.chatbot.data_version
+        save_snapshot(self.snapshot_path, self.chatbot.crypto_data,
+                      self.chatbot.last_update or datetime.now())
+        self._published_version = version
+
+    def refresh(self) -> bool:
+        """Fetch fresh data in the parent and hand it to every worker"""
+        fetched = self.chatbot.fetch_crypto_data()
+        self.publish_snapshot()
+        return fetched
+
+    def imap(self, queries: Iterable[str], batch_size: int = 256) -> Iterator[str]:
+        """Stream responses in query order, fanning batches out across the workers"""
+        # Data swapped in since the last publish (by the refresher or replace_crypto_data) goes out first
+        if self.chatbot.data_version != self._published_version:
+            self.publish_snapshot()
+        for responses in self.pool.imap(_respond_batch, batched(queries, batch_size)):
+            yield from responses
+
+    def respond(self, queries: Iterable[str], batch_size: int = 256) -> List[str]:
+        """Answer all queries and return the responses in order"""
+        return list(self.imap(queries, batch_size))
+
+    def close(self):
+        """Shut down the workers and remove the shared snapshot"""
+        self.pool.close()
+        self.pool.join()
+        shutil.rmtree(self._directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,66 @@
+import json
+import os
+import tempfile
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+DEFAULT_SNAPSHOT_PATH = os.environ.get(
+    'CRYPTOPAL_SNAPSHOT',
+    os.path.join(os.path.expanduser('~'), '.cache', 'cryptopal', 'market_snapshot.json'),
+)
+
+SNAPSHOT_FORMAT = 1
+
+# Only the fields the chatbot reads are persisted to keep the file small
+SNAPSHOT_FIELDS = (
+    'id',
+    'name',
+    'symbol',
+    'current_price',
+    'market_cap',
+    'price_change_percentage_24h',
+    'market_cap_rank',
+)
+
+
+def save_snapshot(path: str, crypto_data: Dict[str, dict], fetched_at: datetime):
+    """Atomically write a market snapshot so concurrent readers never see a partial file"""
+    payload = {
+        'format': SNAPSHOT_FORMAT,
+        'fetched_at': fetched_at.isoformat(),
+        'fields': SNAPSHOT_FIELDS,
+        'rows': [[coin.get(field) for field in SNAPSHOT_FIELDS] for coin in crypto_data.values()],
+    }
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.snapshot-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def load_snapshot(path: str) -> Optional[Tuple[Dict[str, dict], datetime]]:
+    """Load a saved snapshot, returning None if it is missing or unreadable"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+        if payload.get('format') != SNAPSHOT_FORMAT:
+            return None
+        fields = payload['fields']
+        crypto_data = {}
+        for row in payload['rows']:
+            coin = dict(zip(fields, row))
+            crypto_data[coin['id']] = coin
+        fetched_at = datetime.fromisoformat(payload['fetched_at'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if not crypto_data:
+        return None
+    return crypto_data, fetched_at
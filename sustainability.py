@@ -0,0 +1,111 @@
+import json
+import os
+from typing import Dict, Optional, Tuple
+
+from market_store import DEFAULT_SUSTAINABILITY
+
+DEFAULT_METADATA_PATH = os.environ.get(
+    'CRYPTOPAL_SUSTAINABILITY',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'coin_metadata.json'),
+)
+
+METADATA_FORMAT = 1
+
+# Starting score for each consensus mechanism, before the energy adjustment
+CONSENSUS_SCORES = {
+    'proof-of-work': 3,
+    'proof-of-stake': 7,
+    'delegated-proof-of-stake': 7,
+    'liquid-proof-of-stake': 7,
+    'pure-proof-of-stake': 7,
+    'proof-of-history': 7,
+    'proof-of-authority': 7,
+    'federated-byzantine-agreement': 7,
+    'layer-2': 7,
+}
+
+# (max kWh per transaction, adjustment), checked in order; anything above the last band loses a point
+ENERGY_BANDS = ((0.001, 2), (0.01, 1), (100, 0))
+HIGH_ENERGY_PENALTY = -1
+
+
+def score_coin(metadata: dict) -> float:
+    """Sustainability score out of 10 from one coin's metadata
+
+    A reviewed 'score' in the metadata wins; otherwise the score is the
+    consensus mechanism's starting score adjusted by energy per transaction.
+    """
+    if metadata.get('score') is not None:
+        return metadata['score']
+    score = CONSENSUS_SCORES.get(metadata.get('consensus'), DEFAULT_SUSTAINABILITY)
+    energy = metadata.get('energy_kwh_per_tx')
+    if energy is not None:
+        for limit, adjustment in ENERGY_BANDS:
+            if energy <= limit:
+                score += adjustment
+                break
+        else:
+            score += HIGH_ENERGY_PENALTY
+    return max(0, min(10, score))
+
+
+def compute_scores(metadata: Dict[str, dict]) -> Dict[str, float]:
+    """Score every coin in a metadata table in one pass"""
+    return {crypto_id: score_coin(entry) for crypto_id, entry in metadata.items()}
+
+
+def load_metadata(path: str) -> Optional[Dict[str, dict]]:
+    """Load a coin metadata file, returning None if it is missing or unreadable"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+        if payload.get('format') != METADATA_FORMAT:
+            return None
+        coins = payload['coins']
+        if not isinstance(coins, dict):
+            return None
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return None
+    return coins
+
+
+class SustainabilityScores:
+    """Scores for every coin in a metadata file, recomputed when the file changes
+
+    Coins without metadata score DEFAULT_SUSTAINABILITY. scores is replaced,
+    never modified, so a market store built from it stays consistent.
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_METADATA_PATH):
+        self.path = path
+        self.scores: Dict[str, float] = {}
+        self._signature: Optional[Tuple[int, int]] = None  # (mtime_ns, size) of the loaded file
+        self.reload()
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except (OSError, TypeError):
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload(self, force: bool = True, quiet: bool = False) -> bool:
+        """Recompute the scores if the metadata file changed; returns whether they changed"""
+        signature = self._stat() if self.path else None
+        if not force and signature == self._signature:
+            return False
+        self._signature = signature
+        metadata = load_metadata(self.path) if signature is not None else None
+        if metadata is None:
+            if self.path and not quiet:
+                print(f"⚠️ No usable sustainability metadata at {self.path}; "
+                      f"coins score {DEFAULT_SUSTAINABILITY}/10")
+            metadata = {}
+        scores = compute_scores(metadata)
+        if scores == self.scores:
+            return False
+        self.scores = scores
+        return True
+
+    def get(self, crypto_id: str, default: float = DEFAULT_SUSTAINABILITY) -> float:
+        return self.scores.get(crypto_id, default)
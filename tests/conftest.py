@@ -0,0 +1,20 @@
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cryptobot import CryptoChatbot  # noqa: E402
+
+
+@pytest.fixture
+def chatbot() -> CryptoChatbot:
+    """A chatbot serving the built-in fallback coins as fresh live data, with no network or disk state"""
+    bot = CryptoChatbot(snapshot_path=None, nlp_backend='builtin', history_path=None)
+    bot.auto_refresh = False
+    bot.crypto_data = dict(bot.fallback_data)
+    bot.data_source = 'live'
+    bot.last_update = datetime.now()
+    return bot
@@ -0,0 +1,50 @@
+import asyncio
+import json
+import threading
+
+from chat_server import ChatServer
+
+
+async def send(host: str, port: int, line: str, timeout: float) -> dict:
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(line.encode('utf-8') + b'\n')
+    await writer.drain()
+    try:
+        return json.loads(await asyncio.wait_for(reader.readline(), timeout))
+    finally:
+        writer.close()
+
+
+def test_sessions_are_served_while_an_answer_waits_on_a_refresh(chatbot):
+    chatbot.api_url = 'http://127.0.0.1:1/api/v3'  # warm_start's fetch fails at once; fallback data stays
+    chatbot.get_coin_matcher()
+
+    locked, release, released = threading.Event(), threading.Event(), threading.Event()
+
+    def refresh():
+        # Stands in for a refresher rebuilding the market store under the data lock
+        with chatbot._data_lock:
+            locked.set()
+            release.wait(2)
+        released.set()
+
+    async def run():
+        server = ChatServer(chatbot, port=0)
+        await server.start()
+        host, port = server.address.rsplit(':', 1)
+        threading.Thread(target=refresh, daemon=True).start()
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, locked.wait)
+            stalled = asyncio.ensure_future(send(host, int(port), 'bitcoin price?', 5))
+            await asyncio.sleep(0.2)
+            reply = await send(host, int(port), '{"bad": 1}', 1)
+            # Answered while the lock was still held: the stalled query didn't block the loop
+            assert not released.is_set() and not stalled.done()
+            assert reply['error'].startswith("Invalid request")
+            release.set()
+            assert (await stalled)['response'].startswith("💰 Bitcoin (BTC)")
+        finally:
+            release.set()
+            await server.close()
+
+    asyncio.run(run())
@@ -0,0 +1,131 @@
+import random
+import string
+
+import pytest
+
+from fake_coingecko import synthetic_universe
+from intent_index import CoinMatcher, edit_distance, words
+
+COINS = {
+    'bitcoin': {'name': 'Bitcoin', 'symbol': 'btc'},
+    'ethereum': {'name': 'Ethereum', 'symbol': 'eth'},
+    'solana': {'name': 'Solana', 'symbol': 'sol'},
+    'cardano': {'name': 'Cardano', 'symbol': 'ada'},
+    'tezos': {'name': 'Tezos', 'symbol': 'xtz'},
+    'bitcoin-cash': {'name': 'Bitcoin Cash', 'symbol': 'bch'},
+    'usd-coin': {'name': 'USD Coin', 'symbol': 'usdc'},
+    # Its symbol is another coin's name; the name wins
+    'wrapped-cardano': {'name': 'Wrapped Ada', 'symbol': 'cardano'},
+}
+
+
+@pytest.fixture(scope='module')
+def matcher() -> CoinMatcher:
+    return CoinMatcher(COINS)
+
+
+@pytest.mark.parametrize('query, expected', [
+    ("what's the sol price?", ['solana']),
+    ("check the console output", []),
+    ("anything sold today?", []),
+    ("etherium price", ['ethereum']),
+    ("how is cardno doing", ['cardano']),
+    ("tezoz or bitcoin", ['tezos', 'bitcoin']),
+    ("bitcoin cash vs bitcoin", ['bitcoin-cash', 'bitcoin']),
+    ("is usd-coin pegged", ['usd-coin']),
+    ("usd coin", ['usd-coin']),
+    ("cardano", ['cardano']),
+    ("BTC and ETH", ['bitcoin', 'ethereum']),
+    ("which coins are trending right now", []),
+])
+def test_find(matcher, query, expected):
+    assert matcher.find(query) == expected
+
+
+def osa_distance(a: str, b: str) -> int:
+    """Reference optimal string alignment distance, without a limit"""
+    d = [[i + j if i * j == 0 else 0 for j in range(len(b) + 1)] for i in range(len(a) + 1)]
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            d[i][j] = min(d[i - 1][j] + 1, d[i][j - 1] + 1, d[i - 1][j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                d[i][j] = min(d[i][j], d[i - 2][j - 2] + 1)
+    return d[-1][-1]
+
+
+def typo(word: str, rng: random.Random, edits: int) -> str:
+    for _ in range(edits):
+        position = rng.randrange(len(word))
+        kind = rng.choice(['swap', 'delete', 'insert', 'replace'])
+        if kind == 'swap' and position < len(word) - 1:
+            word = word[:position] + word[position + 1] + word[position] + word[position + 2:]
+        elif kind == 'delete' and len(word) > 5:
+            word = word[:position] + word[position + 1:]
+        elif kind == 'insert':
+            word = word[:position] + rng.choice(string.ascii_lowercase) + word[position:]
+        else:
+            word = word[:position] + rng.choice(string.ascii_lowercase) + word[position + 1:]
+    return word
+
+
+def test_edit_distance_matches_the_reference_up_to_its_limit():
+    rng = random.Random(1)
+    for _ in range(500):
+        a = ''.join(rng.choice('abcde') for _ in range(rng.randint(0, 9)))
+        b = typo(a, rng, rng.randint(0, 3)) if a and rng.random() < 0.7 else \
+            ''.join(rng.choice('abcde') for _ in range(rng.randint(0, 9)))
+        for limit in (1, 2):
+            assert edit_distance(a, b, limit) == min(osa_distance(a, b), limit + 1), (a, b, limit)
+    assert edit_distance('etherium', 'ethereum', 1) == 1
+    assert edit_distance('cardnao', 'cardano', 1) == 1  # A swap is one edit
+
+
+def test_closest_agrees_with_a_brute_force_scan():
+    rng = random.Random(5)
+    names = set()
+    while len(names) < 800:
+        names.add(''.join(rng.choice('abcdefghilmnoprstu') for _ in range(rng.randint(5, 12))))
+    coins = {name: {'name': name.title(), 'symbol': name[:3]} for name in sorted(names)}
+    matcher = CoinMatcher(coins)
+
+    for _ in range(200):
+        phrase = typo(rng.choice(matcher.terms), rng, rng.randint(1, 3))
+        limit = 2 if len(phrase) >= 9 else 1
+        distances = [osa_distance(phrase, term) if abs(len(term) - len(phrase)) <= limit else limit + 1
+                     for term in matcher.terms]
+        best = min(distances)
+        nearest = {matcher.term_coins[index] for index, distance in enumerate(distances) if distance == best}
+        # Several coins equally close are no match
+        expected = next(iter(nearest)) if best <= limit and len(phrase) >= 5 and len(nearest) == 1 else None
+        assert matcher.closest(phrase) == expected, phrase
+
+
+@pytest.fixture(scope='module')
+def universe_matcher() -> CoinMatcher:
+    """10k coins in a few large name families, as in a full CoinGecko listing"""
+    coins = {coin['id']: coin for coin in synthetic_universe(10000)}
+    for base in ['Bitcoin', 'Ether', 'Solana'] + [f'Synthcoin {index}' for index in range(2000)]:
+        crypto_id = 'wrapped-' + '-'.join(words(base))
+        coins[crypto_id] = {'name': f'Wrapped {base}', 'symbol': 'w' + crypto_id[8:12]}
+    for name in ['Shiba Inu', 'Shiba Inu Classic', 'Baby Shiba', 'Dogelon Inu', 'Floki Inu']:
+        coins['-'.join(words(name))] = {'name': name, 'symbol': name[:4].lower()}
+    return CoinMatcher(coins)
+
+
+@pytest.mark.parametrize('query, expected', [
+    ("wrapped bitcon price", ['wrapped-bitcoin']),
+    ("sinthcoin 123", ['synth-123']),
+    ("synthc0in 99 price", ['synth-99']),
+    ("wrapped synthcon 1500", ['wrapped-synthcoin-1500']),
+    ("shiba inuu price", ['shiba-inu']),
+    ("etherium price", ['ethereum']),
+    # A family word alone is as close to many coins as to any one
+    ("how is synthcoin doing", []),
+    ("what about shiba", []),
+])
+def test_find_typos_in_large_name_families(universe_matcher, query, expected):
+    assert universe_matcher.find(query) == expected
+
+
+def test_words_split_on_punctuation():
+    assert words("What's USD-Coin's price?") == ['what', 's', 'usd', 'coin', 's', 'price']
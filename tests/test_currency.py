@@ -0,0 +1,21 @@
+from fx_rates import FxRates
+
+
+def test_usd_fallback_note_follows_the_reply_directly(chatbot):
+    chatbot.fx_rates = FxRates()  # No rates fetched yet
+    note = "\n\n💱 No EUR exchange rate yet, so prices are in USD."
+
+    for query in ("what's trending in euros?", "bitcoin price in euros"):
+        response = chatbot.respond_to_query(query)
+        assert response.endswith(note)
+        assert "\n\n\n" not in response
+        assert response[:-len(note)] == chatbot.respond_to_query(query.rsplit(' in ', 1)[0]).rstrip()
+
+    batch = chatbot.respond_to_queries(["top coins by market cap", "what's trending?"], currency='eur')
+    assert all(response.endswith(note) and "\n\n\n" not in response for response in batch)
+
+
+def test_converted_replies_use_the_cached_rates(chatbot):
+    chatbot.fx_rates.update({'eur': 0.5})
+    response = chatbot.respond_to_query("bitcoin price in euros")
+    assert "Price: €33,710.00" in response and "💱" not in response
@@ -0,0 +1,156 @@
+import pytest
+import requests
+
+import market_fetcher
+from market_fetcher import MarketFetcher, TokenBucket
+from metrics import MetricsRegistry
+
+
+class FakeClock:
+    """Stands in for time.monotonic and time.sleep, so waits pass instantly but are recorded"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(market_fetcher.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(market_fetcher.time, 'sleep', clock.sleep)
+    return clock
+
+
+def http_error(status: int, retry_after: str = None) -> requests.exceptions.HTTPError:
+    response = requests.Response()
+    response.status_code = status
+    response.url = 'https://api.example/coins/markets?ids=bitcoin,ethereum'
+    if retry_after is not None:
+        response.headers['Retry-After'] = retry_after
+    return requests.exceptions.HTTPError(f"{status} Error for url: {response.url}", response=response)
+
+
+def stub_fetcher(responses, per_page: int = 250, max_retries: int = 2) -> MarketFetcher:
+    """A fetcher whose _get pops the next outcome for each page: a list of coins, or an exception to raise"""
+    fetcher = MarketFetcher(requests.Session(), 'https://api.example', per_page=per_page, max_workers=1,
+                            max_retries=max_retries, metrics=MetricsRegistry())
+    fetcher.calls = []
+
+    def get(params, path='coins/markets'):
+        fetcher.calls.append(params.get('ids'))
+        outcome = responses(params) if callable(responses) else responses.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    fetcher._get = get
+    return fetcher
+
+
+def test_retry_after_is_honored(clock):
+    fetcher = stub_fetcher([http_error(429, retry_after='7'), [{'id': 'bitcoin'}]])
+    assert fetcher.fetch_page(['bitcoin']) == [{'id': 'bitcoin'}]
+    assert clock.sleeps == [7.0]
+    assert fetcher.retries_total.value(status=429) == 1
+
+
+def test_retries_back_off_then_give_up(clock):
+    fetcher = stub_fetcher(lambda params: http_error(503), max_retries=2)
+    with pytest.raises(requests.exceptions.HTTPError):
+        fetcher.fetch_page(['bitcoin'])
+    assert len(fetcher.calls) == 3 and clock.sleeps == [0.5, 1.0]
+
+
+def test_client_errors_are_not_retried(clock):
+    fetcher = stub_fetcher(lambda params: http_error(404))
+    with pytest.raises(requests.exceptions.HTTPError):
+        fetcher.fetch_page(['bitcoin'])
+    assert len(fetcher.calls) == 1 and clock.sleeps == []
+
+
+def test_token_bucket_allows_a_burst_then_refills(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.sleeps == []
+    bucket.acquire()  # Empty: waits for the next token
+    assert clock.sleeps == [pytest.approx(0.5)]
+
+    clock.now += 10  # Refills, but never beyond the burst capacity
+    for _ in range(3):
+        bucket.acquire()
+    assert len(clock.sleeps) == 1
+    bucket.acquire()
+    assert len(clock.sleeps) == 2
+
+
+def moved_page(crypto_data: dict, ids: str) -> list:
+    """The API's reply for a page: every coin on it 10% up"""
+    return [{**crypto_data[crypto_id], 'current_price': crypto_data[crypto_id]['current_price'] * 1.1}
+            for crypto_id in ids.split(',')]
+
+
+def test_a_failed_page_keeps_the_previous_values(chatbot, clock, capsys):
+    previous = dict(chatbot.crypto_data)
+    chatbot.coin_ids = list(previous)
+    failing = chatbot.coin_ids[2:4]
+    failing_page = ','.join(failing)
+
+    def respond(params):
+        if 'ids' not in params:
+            return {'rates': {'usd': {'value': 60000, 'unit': '$'}}}
+        return http_error(502) if params['ids'] == failing_page else moved_page(previous, params['ids'])
+    chatbot.fetcher = stub_fetcher(respond, per_page=2)
+
+    assert chatbot.fetch_crypto_data()
+    for crypto_id in chatbot.coin_ids:
+        expected = previous[crypto_id]['current_price'] * (1 if crypto_id in failing else 1.1)
+        assert chatbot.crypto_data[crypto_id]['current_price'] == pytest.approx(expected), crypto_id
+    assert chatbot.data_source == 'live'
+    assert chatbot.refresh_total.value(result='partial') == 1
+    assert chatbot.fetcher.pages_total.value(result='error') == 1
+
+    # The warning names the page and the failure, not the request URL and its coin ids
+    output = capsys.readouterr().out
+    assert "1 page(s) failed (page 1: HTTPError 502)" in output
+    assert "api.example" not in output and failing_page not in output
+
+
+def test_every_page_failing_keeps_the_last_good_data(chatbot, clock):
+    previous = chatbot.crypto_data
+    chatbot.fetcher = stub_fetcher(lambda params: http_error(503), per_page=4, max_retries=0)
+    assert not chatbot.fetch_crypto_data()
+    assert chatbot.crypto_data is previous and chatbot.data_source == 'live'
+    assert chatbot.refresh_total.value(result='api_error') == 1
+    assert chatbot.fallback_total.value() == 0
+
+
+@pytest.mark.parametrize('failing', [False, True])
+def test_background_refreshes_print_nothing(chatbot, clock, capsys, failing):
+    previous = dict(chatbot.crypto_data)
+    chatbot.coin_ids = list(previous)
+
+    def respond(params):
+        if 'ids' not in params:
+            return http_error(500) if failing else {'rates': {'usd': {'value': 60000, 'unit': '$'}}}
+        return http_error(503) if failing else moved_page(previous, params['ids'])
+    chatbot.fetcher = stub_fetcher(respond, per_page=4, max_retries=0)
+
+    chatbot.start_refresher()  # Not due for a while, so its thread just waits
+    try:
+        assert chatbot.refresher.refresh() != failing
+    finally:
+        chatbot.stop_refresher()
+    assert capsys.readouterr().out == ""
+    assert chatbot.refresh_total.value(result='api_error' if failing else 'success') == 1
+
+    # The same outcome fetched in the foreground is reported
+    chatbot.fetch_crypto_data()
+    assert ("API Error" if failing else "✅ Live crypto data loaded") in capsys.readouterr().out
@@ -0,0 +1,107 @@
+import random
+
+import pytest
+
+from fake_coingecko import synthetic_universe
+from market_store import VIEW_NAMES, MarketStore, changed_views, compute_delta
+
+RATE = 0.9
+
+
+def universe(size: int = 300, seed: int = 0) -> dict:
+    return {coin['id']: coin for coin in synthetic_universe(size, seed=seed)}
+
+
+def scores_for(crypto_data: dict) -> dict:
+    return {crypto_id: random.Random(crypto_id).randint(1, 10) for crypto_id in crypto_data}
+
+
+def churn(crypto_data: dict, rng: random.Random, extra: dict) -> dict:
+    """The next snapshot: some coins move, a few are added and, sometimes, some are dropped"""
+    new = dict(crypto_data)
+    for crypto_id in rng.sample(list(new), 20):
+        coin = dict(new[crypto_id])
+        field = rng.choice(['current_price', 'price_change_percentage_24h', 'market_cap', 'market_cap_rank'])
+        if field == 'price_change_percentage_24h':
+            coin[field] = rng.choice([rng.uniform(-10, 10), 0.0, coin[field], -coin[field]])
+        elif field == 'market_cap_rank':
+            coin[field] = rng.randint(1, 400)
+        else:
+            coin[field] = coin[field] * rng.uniform(0.5, 1.5)
+        new[crypto_id] = coin
+    for crypto_id in rng.sample(sorted(extra), 2):
+        new.setdefault(crypto_id, extra[crypto_id])
+    if rng.random() < 0.2:
+        for crypto_id in rng.sample(list(new), 3):
+            del new[crypto_id]
+    return new
+
+
+def assert_same(patched: MarketStore, rebuilt: MarketStore):
+    assert patched.ids == rebuilt.ids
+    for name in VIEW_NAMES:
+        assert patched.view(name) == rebuilt.view(name), name
+    assert patched.columns == rebuilt.columns
+    assert patched.currency_view('eur', RATE) == rebuilt.currency_view('eur', RATE)
+
+
+def test_apply_matches_a_full_rebuild_over_many_refreshes():
+    rng = random.Random(7)
+    extra = {f"new-{crypto_id}": {**coin, 'id': f"new-{crypto_id}"} for crypto_id, coin in universe(50, 1).items()}
+    crypto_data = universe()
+    scores = scores_for({**crypto_data, **extra})
+    store = MarketStore(crypto_data, scores)
+    store.currency_view('eur', RATE)  # Patched from here on rather than rebuilt
+    for _ in range(40):
+        new = churn(crypto_data, rng, extra)
+        delta = compute_delta(crypto_data, new)
+        patched = store.apply(new, delta)
+        rebuilt = MarketStore(new, scores)
+        assert_same(patched, rebuilt)
+        assert changed_views(store, patched) == changed_views(store, rebuilt)
+        store, crypto_data = patched, new
+
+
+def test_apply_with_an_empty_delta_shares_everything():
+    crypto_data = universe(20)
+    store = MarketStore(crypto_data, {})
+    same = store.apply(dict(crypto_data), compute_delta(crypto_data, dict(crypto_data)))
+    assert same.ids is store.ids and same.gainers is store.gainers
+    assert changed_views(store, same) == frozenset()
+
+
+def test_compute_delta_reports_added_removed_and_changed_fields():
+    old = universe(5)
+    ids = list(old)
+    new = {crypto_id: coin for crypto_id, coin in old.items() if crypto_id != ids[0]}
+    new[ids[1]] = {**old[ids[1]], 'current_price': 1.0, 'name': 'Renamed'}
+    new['fresh'] = {**old[ids[2]], 'id': 'fresh'}
+    delta = compute_delta(old, new)
+    assert delta.added == ['fresh'] and delta.removed == {ids[0]}
+    assert delta.changed == {ids[1]: {'current_price', 'name'}}
+    assert delta.renames_coins and delta.touched == {'fresh', ids[0], ids[1]}
+
+
+def test_a_price_move_updates_only_replies_showing_that_coin(chatbot):
+    trending = chatbot.respond_to_query("what's trending?")
+    bitcoin = chatbot.respond_to_query("bitcoin price?")
+    assert "Solana: +4.50% ($189.00)" in trending
+
+    crypto_data = dict(chatbot.crypto_data)
+    crypto_data['solana'] = {**crypto_data['solana'], 'current_price': 201.5}
+    chatbot.crypto_data = crypto_data
+
+    assert "Solana: +4.50% ($201.50)" in chatbot.respond_to_query("what's trending?")
+    cached = chatbot.response_cache.get((frozenset(chatbot.analyze_query("bitcoin price?")), 'usd'))
+    assert cached is not None and cached.text == bitcoin
+
+
+@pytest.mark.parametrize('change', [-1.0, 9.0])
+def test_a_reshuffled_ranking_drops_replies_reading_it(chatbot, change):
+    chatbot.respond_to_query("what's trending?")
+    crypto_data = dict(chatbot.crypto_data)
+    crypto_data['bitcoin'] = {**crypto_data['bitcoin'], 'price_change_percentage_24h': change}
+    chatbot.crypto_data = crypto_data
+    lines = chatbot.respond_to_query("what's trending?").splitlines()
+    assert (lines[1] == "• Bitcoin: +9.00% ($67,420.00)") == (change > 0)
+    assert all("Bitcoin" not in line for line in lines) == (change < 0)
@@ -0,0 +1,23 @@
+import io
+import json
+
+
+def test_a_failing_request_gets_an_error_line_and_the_stream_continues(chatbot, monkeypatch):
+    answer_query = chatbot.answer_query
+
+    def flaky(query, currency=None):
+        if query == 'boom':
+            raise RuntimeError("renderer exploded")
+        return answer_query(query, currency)
+
+    monkeypatch.setattr(chatbot, 'answer_query', flaky)
+    infile = io.StringIO('"bitcoin price?"\n{"id": 7, "query": "boom"}\n{"query": 3}\n\n{"id": 9, "query": "hi"}\n')
+    outfile = io.StringIO()
+    chatbot.stream_ndjson(infile, outfile, flush_every=2)
+
+    results = [json.loads(line) for line in outfile.getvalue().splitlines()]
+    assert results[0]['response'].startswith("💰 Bitcoin (BTC)")
+    assert results[1] == {'id': 7, 'line': 2, 'error': "Internal error: renderer exploded"}
+    assert results[2]['line'] == 3 and results[2]['error'].startswith("Invalid request")
+    assert results[3]['id'] == 9 and results[3]['response'].startswith("👋 Hello there!")
+    assert len(results) == 4
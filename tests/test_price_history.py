@@ -0,0 +1,167 @@
+import math
+import os
+import random
+import statistics
+from datetime import datetime, timedelta
+
+import pytest
+
+from price_history import COARSE_CAPACITY, MOMENTUM_WINDOWS, CoinSeries, PriceHistory
+
+START = datetime(2026, 1, 1, 12, 0)
+
+
+def moved(crypto_data: dict, changes: dict) -> dict:
+    """A copy of a snapshot with some coins' prices scaled"""
+    return {crypto_id: {**coin, 'current_price': coin['current_price'] * changes.get(crypto_id, 1.0)}
+            for crypto_id, coin in crypto_data.items()}
+
+
+def record_two_hours(chatbot):
+    """Give the chatbot two hours of in-memory history in which Polygon and Bitcoin gained"""
+    chatbot.price_history = PriceHistory(None)
+    chatbot.record_history(chatbot.crypto_data, START)
+    chatbot.record_history(moved(chatbot.crypto_data, {'polygon': 1.2, 'bitcoin': 1.05}), START + timedelta(hours=2))
+
+
+def test_trend_window_switch_drops_cached_trending_replies(chatbot):
+    record_two_hours(chatbot)
+    assert "(24h gains)" in chatbot.respond_to_query("what's trending?")
+
+    chatbot.trend_window = '1h'
+    response = chatbot.respond_to_query("what's trending?")
+    assert response.startswith("📈 Currently trending (1h momentum):\n• Polygon: +20.00%")
+
+    chatbot.trend_window = None
+    assert "(24h gains)" in chatbot.respond_to_query("what's trending?")
+
+
+def test_history_first_covering_the_window_drops_cached_trending_replies(chatbot):
+    chatbot.price_history = PriceHistory(None)
+    chatbot.trend_window = '1h'
+    chatbot.record_history(chatbot.crypto_data, START)
+    assert "(24h gains)" in chatbot.respond_to_query("what's trending?")
+
+    chatbot.record_history(moved(chatbot.crypto_data, {'algorand': 1.1}), START + timedelta(hours=1))
+    assert chatbot.respond_to_query("what's trending?").startswith(
+        "📈 Currently trending (1h momentum):\n• Algorand: +10.00%")
+
+
+def random_walk(count: int, step: float = 300, seed: int = 0):
+    """(timestamp, price) samples every step seconds"""
+    rng = random.Random(seed)
+    timestamp, price = START.timestamp(), 100.0
+    for _ in range(count):
+        timestamp += step
+        price *= math.exp(rng.gauss(0, 0.01))
+        yield timestamp, price
+
+
+def expected_momentum(samples, span: float) -> float:
+    """Percent change from the newest sample at least span old, by brute force"""
+    latest_time, latest = samples[-1]
+    reference = [price for timestamp, price in samples if timestamp <= latest_time - span][-1]
+    return (latest / reference - 1) * 100
+
+
+def test_momentum_volatility_and_averages_match_brute_force():
+    samples = list(random_walk(400))
+    series = CoinSeries(capacity=320)
+    for timestamp, price in samples:
+        series.append(timestamp, price)
+
+    retained = samples[-320:]
+    for window in ('1h', '6h', '24h'):
+        assert series.momentum(window) == pytest.approx(expected_momentum(retained, MOMENTUM_WINDOWS[window]))
+    day = [(timestamp, price) for timestamp, price in retained if timestamp >= samples[-1][0] - 24 * 3600]
+    returns = [math.log(price / previous) for (_, previous), (_, price) in zip(day, day[1:])]
+    assert series.volatility() == pytest.approx(statistics.stdev(returns) * 100, rel=1e-3)
+    hour = [price for timestamp, price in retained if timestamp >= samples[-1][0] - 3600]
+    assert series.moving_averages()[0] == pytest.approx(statistics.mean(hour))
+
+
+def test_long_windows_read_the_coarse_ring():
+    samples = list(random_walk(8 * 24 * 12))  # Eight days every 5 minutes
+    series = CoinSeries(capacity=320)
+    for timestamp, price in samples:
+        series.append(timestamp, price)
+
+    # Memory stays bounded by what the windows need, not by how long the history is
+    assert len(series.times) == 320 and len(series.coarse_times) == COARSE_CAPACITY
+    # Hourly samples: the 7d reference is the first sample of its hour
+    hourly = samples[::12]
+    assert series.momentum('7d') == pytest.approx(expected_momentum(hourly + samples[-1:], 7 * 24 * 3600))
+    assert series.momentum('1h') == pytest.approx(expected_momentum(samples, 3600))
+
+
+def test_gaps_longer_than_twice_the_window_have_no_momentum():
+    series = CoinSeries()
+    for hours, price in ((0, 10.0), (3, 11.0), (7, 12.0)):
+        series.append(START.timestamp() + hours * 3600, price)
+    assert series.momentum('1h') is None  # The newest hour-old sample is four hours old
+    assert series.momentum('6h') == pytest.approx(20.0)
+
+
+def history_file(tmp_path) -> str:
+    return str(tmp_path / 'history' / 'price_history.bin')
+
+
+def record_walk(history: PriceHistory, count: int, start: int = 0):
+    for index, (timestamp, price) in enumerate(random_walk(start + count)):
+        if index >= start:
+            history.record({'bitcoin': {'current_price': price}, 'solana': {'current_price': 200 - price / 10},
+                            'unpriced': {'current_price': None}}, datetime.fromtimestamp(timestamp))
+
+
+def summaries(history: PriceHistory) -> dict:
+    return {crypto_id: history.summary(crypto_id) for crypto_id in history.series}
+
+
+def test_log_replays_to_the_same_analytics(tmp_path):
+    path = history_file(tmp_path)
+    history = PriceHistory(path, capacity=64, coarse_capacity=8)
+    record_walk(history, 100)
+    assert set(history.series) == {'bitcoin', 'solana'}
+
+    reloaded = PriceHistory(path, capacity=64, coarse_capacity=8)
+    assert summaries(reloaded) == summaries(history)
+    assert reloaded.top_movers('1h') == history.top_movers('1h')
+
+
+def test_torn_final_frame_is_truncated_on_load(tmp_path):
+    path = history_file(tmp_path)
+    history = PriceHistory(path, capacity=64)
+    record_walk(history, 10)
+    good_size = os.path.getsize(path)
+    with open(path, 'ab') as f:
+        f.write(b'\x00\x00\x00\x00\x00\x00\xf0\x41\x02\x00\x00\x00\x07bitc')  # Header and half an entry
+
+    reloaded = PriceHistory(path, capacity=64)
+    assert os.path.getsize(path) == good_size
+    assert summaries(reloaded) == summaries(history)
+    # The next frame lands on a clean boundary
+    record_walk(reloaded, 1, start=10)
+    assert PriceHistory(path, capacity=64).series['bitcoin'].count == 11
+
+
+def test_compaction_bounds_the_log_and_keeps_the_coarse_samples(tmp_path):
+    path = history_file(tmp_path)
+    history = PriceHistory(path, capacity=24, coarse_capacity=6)
+    record_walk(history, 400)
+    assert history._frames_on_disk <= 2 * (24 + 6)
+
+    reloaded = PriceHistory(path, capacity=24, coarse_capacity=6)
+    for crypto_id, series in history.series.items():
+        assert list(reloaded.series[crypto_id].samples()) == list(series.samples())
+        assert reloaded.momentum(crypto_id, '6h') == pytest.approx(series.momentum('6h'))
+
+
+def test_processes_sharing_a_log_keep_every_frame(tmp_path):
+    path = history_file(tmp_path)
+    first, second = PriceHistory(path, capacity=64), PriceHistory(path, capacity=64)
+    samples = list(random_walk(20))
+    for index, (timestamp, price) in enumerate(samples):
+        writer = first if index % 2 else second
+        writer.record({'bitcoin': {'current_price': price}}, datetime.fromtimestamp(timestamp))
+    assert [price for _, price in PriceHistory(path, capacity=64).series['bitcoin'].samples()] == \
+        pytest.approx([price for _, price in samples])
@@ -0,0 +1,30 @@
+import pytest
+
+from serving import QueryPool
+
+QUERIES = [
+    "what's trending?", "bitcoin price?", "most sustainable crypto", "hello", "top coins by market cap",
+    "tell me about ethereum", "solana price in euros", "is cardano profitable", "bitcoin price?", "???",
+]
+
+
+@pytest.fixture
+def pool(chatbot):
+    with QueryPool(processes=2, chatbot=chatbot, nlp_backend='builtin') as pool:
+        yield pool
+
+
+def test_answers_come_back_in_input_order(pool, chatbot):
+    queries = QUERIES * 5
+    # Small batches spread the queries over both workers
+    assert pool.respond(queries, batch_size=3) == chatbot.respond_to_queries(queries)
+    assert list(pool.imap(iter(queries), batch_size=7)) == chatbot.respond_to_queries(queries)
+
+
+def test_replaced_data_reaches_every_worker(pool, chatbot):
+    assert all("$67,420.00" in response for response in pool.respond(["bitcoin price?"] * 16, batch_size=1))
+
+    crypto_data = dict(chatbot.crypto_data)
+    crypto_data['bitcoin'] = {**crypto_data['bitcoin'], 'current_price': 71234.5}
+    chatbot.replace_crypto_data(crypto_data)
+    assert all("$71,234.50" in response for response in pool.respond(["bitcoin price?"] * 16, batch_size=1))
@@ -0,0 +1,82 @@
+import random
+
+import pytest
+
+from cryptobot import ADVICE_RULES
+from fake_coingecko import synthetic_universe
+from market_store import MarketStore
+from rule_engine import Rule, RuleEngine
+
+COLUMNS = {
+    'price': [10.0, 250.0, 0.5, 42.0, 3.0],
+    'change_24h': [1.5, -2.0, 7.25, 3.0, 0.0],
+    'sustainability': [8, 3, 9, 7, 5],
+}
+IDS = ['alpha', 'beta', 'gamma', 'delta', 'epsilon']
+
+
+def test_conditions_are_anded_then_ordered_and_limited():
+    engine = RuleEngine([
+        Rule('green_gainers', intents=['sustainable'], when=[('change_24h', '>', 0), ('sustainability', '>=', 7)],
+             order_by='change_24h', limit=2),
+        Rule('cheap', intents=['price'], when=[('price', '<', 20)], order_by='price', descending=False),
+        Rule('everything', intents=['market']),
+    ])
+    results = engine.bind(COLUMNS, IDS)
+
+    assert results.matches('green_gainers') == ['gamma', 'delta']
+    assert results.count('green_gainers') == 3  # alpha also passes, but the limit is 2
+    assert results.matches('cheap') == ['gamma', 'epsilon', 'alpha']
+    assert results.matches('everything') == IDS
+
+
+def test_shared_conditions_are_compiled_once():
+    engine = RuleEngine([
+        Rule('a', when=[('sustainability', '>=', 7), ('change_24h', '>', 0)]),
+        Rule('b', when=[('sustainability', '>=', 7)]),
+        Rule('c', when=[('change_24h', '>', 0), ('price', 'in', (10.0, 42.0))]),
+    ])
+    assert len(engine.conditions) == 3
+    assert engine.rule_conditions['b'] == engine.rule_conditions['a'][:1]
+    assert engine.bind(COLUMNS, IDS).matches('c') == ['alpha', 'delta']
+
+
+def test_first_declared_rule_wins():
+    engine = RuleEngine([Rule('greeting', intents=['greeting']), Rule('price', intents=['price', 'market']),
+                         Rule('market', intents=['market'])])
+    assert engine.first_match({'market', 'price'}).name == 'price'
+    assert engine.first_match({'market'}).name == 'price'
+    assert engine.first_match({'market', 'greeting'}).name == 'greeting'
+    assert engine.first_match({'unknown'}) is None
+    assert [rule.name for rule in engine.triggered(['market'])] == ['price', 'market']
+
+
+def test_invalid_rules_are_rejected():
+    with pytest.raises(ValueError):
+        Rule('bad', when=[('price', '~', 1)])
+    with pytest.raises(ValueError):
+        RuleEngine([Rule('twice'), Rule('twice')])
+
+
+def test_presorted_orderings_match_a_full_sort():
+    coins = {coin['id']: coin for coin in synthetic_universe(500, seed=3)}
+    scores = {crypto_id: random.Random(crypto_id).randint(1, 10) for crypto_id in coins}
+    store = MarketStore(coins, scores)
+    engine = RuleEngine(ADVICE_RULES)
+    walked = engine.bind(store.columns, store.ids, store.ordering)
+    sorted_ = engine.bind(store.columns, store.ids)
+    for rule in ADVICE_RULES:
+        assert walked.matches(rule.name) == sorted_.matches(rule.name), rule.name
+
+
+def test_replacing_the_rule_engine_drops_cached_replies(chatbot):
+    assert chatbot.respond_to_query("most sustainable").startswith("🌱 Most sustainable cryptocurrencies:")
+
+    green_movers = Rule('green_movers', intents=['sustainable'], title='Green coins up 2%+ today',
+                        when=[('change_24h', '>', 2), ('sustainability', '>=', 8)], order_by='change_24h')
+    chatbot.rule_engine = RuleEngine((green_movers,) + ADVICE_RULES)
+
+    response = chatbot.respond_to_query("most sustainable")
+    assert response.startswith("🔎 Green coins up 2%+ today:")
+    assert [line.split(':')[0] for line in response.splitlines()[1:]] == ['• Solana', '• Cardano', '• Algorand']
+    assert chatbot.screen(['sustainable'])['green_movers'] == ['solana', 'cardano', 'algorand']